@@ -4,54 +4,888 @@
 Deliverable 1A
 """
 
+import os
 import re
-import nltk
-from nltk import word_tokenize, pos_tag
-
-# One-time resource setup (safe to re-run)
-try:
-    nltk.data.find("tokenizers/punkt_tab")
-except LookupError:
-    nltk.download("punkt_tab")
-try:
-    nltk.data.find("taggers/averaged_perceptron_tagger_eng")
-except LookupError:
-    nltk.download("averaged_perceptron_tagger_eng")
+import sys
+import json
+import time
+import hashlib
+import inspect
+import itertools
+import multiprocessing
+from array import array
+from collections import Counter, namedtuple
+
+from reconstruction_cache import ReconstructionCache, normalize_sentence
+
+# Importing this module must stay cheap: NLTK itself is only imported, and
+# its resources only loaded, on the first reconstruct call (see below).
+IMPORT_TIME_BUDGET = 0.2  # seconds, checked by `--check-import-time`
+
+# === NLTK Resources ===
+
+NLTK_RESOURCES = {
+    "tokenizers/punkt_tab": "punkt_tab",
+    "taggers/averaged_perceptron_tagger_eng": "averaged_perceptron_tagger_eng",
+}
+
+_nltk_tools = None
+
+def offline_mode():
+    return os.environ.get("NLTK_OFFLINE", "").lower() in ("1", "true", "yes")
+
+def load_nltk_resources(offline=None):
+    """
+    Return `(word_tokenize, tagger)`, loading them on the first call in this
+    process and reusing them afterwards. Missing resources are downloaded,
+    except in offline mode (`offline=True` or NLTK_OFFLINE=1), where a
+    LookupError naming them is raised without touching the network.
+    """
+    global _nltk_tools
+    if _nltk_tools is not None:
+        return _nltk_tools
+
+    import nltk
+    from nltk.tag.perceptron import PerceptronTagger
+
+    if offline is None:
+        offline = offline_mode()
+    missing = []
+    for path, package in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            missing.append(package)
+    if missing and offline:
+        raise LookupError(
+            f"NLTK resources {missing} are not installed and offline mode forbids downloading them. "
+            f"Install them with `python -m nltk.downloader {' '.join(missing)}` or point NLTK_DATA "
+            f"at a directory that has them."
+        )
+    for package in missing:
+        if not nltk.download(package, quiet=True):
+            raise LookupError(f"Could not download NLTK resource {package!r}")
+
+    _nltk_tools = (nltk.word_tokenize, PerceptronTagger())
+    return _nltk_tools
+
+RuleEdit = namedtuple("RuleEdit", "rule start end before after")
+RuleEdit.__doc__ = """One token edit made by a rule; `start:end` is its span in the input sentence."""
+
+class TokenStream:
+    """
+    Shared view of the sentence being reconstructed. Rules change it through
+    token edits `(start, end, replacement_tokens)`; the stream keeps, for every
+    token, the character span of the input it comes from, so each edit is
+    recorded against exact input offsets and text rules see single-spaced
+    text that keeps adjacent unchanged tokens together. The output is
+    detokenized once, with closing punctuation attached. POS tags, regex rewrite sites, pattern
+    matches and trigger lookups are derived lazily from the pipeline's tagger,
+    matcher, automaton and trigger index, and only again after an edit.
+    """
+    def __init__(self, text, pipeline, tagged=None):
+        self.original = text
+        self._tokens = [word for word, _ in tagged] if tagged is not None else None
+        self._tagged = tagged
+        # Per token: (start, end, verbatim) in `original`; inserted tokens get
+        # the span they replaced with verbatim=False
+        self._spans = None
+        self._pipeline = pipeline
+        self.edits = []
+        # Words around the edits made since the caller last cleared it
+        self.touched = set()
+        self._reset_derived()
+
+    def _reset_derived(self):
+        self._text = None
+        self._offsets = None
+        self._words = None
+        self._sites = None
+        self._matches = None
+        self._word_triggered = None
+        self._tag_triggered = None
+
+    @property
+    def tokens(self):
+        if self._tokens is None:
+            self._tokens = self._pipeline.tokenize(self.original)
+        return self._tokens
+
+    def tokenize(self, text):
+        return self._pipeline.tokenize(text)
+
+    @property
+    def tagged(self):
+        if self._tagged is None:
+            self._tagged = self._pipeline.tagger.tag(self.tokens)
+        return self._tagged
+
+    @property
+    def spans(self):
+        if self._spans is None:
+            self._spans = align_tokens(self.tokens, self.original)
+        return self._spans
+
+    def _render(self):
+        if self._text is None:
+            self._text, self._offsets = detokenize(self.tokens, self.spans, self.original)
+        return self._text, self._offsets
+
+    def _verbatim(self):
+        # The input is its own text view while unedited and singly spaced
+        return not self.edits and self.original == ' '.join(self.original.split())
+
+    @property
+    def text(self):
+        """
+        Text seen by text and regex rules: the tokens joined by single spaces,
+        except where the input had none between two unchanged tokens.
+        """
+        if self._verbatim():
+            return self.original
+        return self._render()[0]
+
+    def text_offsets(self):
+        """`(start, end)` of every token within `text`, or None where it cannot be located."""
+        if self._verbatim():
+            return [span[:2] if span is not None else None for span in self.spans]
+        return self._render()[1]
+
+    @property
+    def words(self):
+        """Lowercased word-character runs of the sentence, for trigger lookups."""
+        if self._words is None:
+            if self.edits:
+                self._words = {word for token in self._tokens for word in WORD_RE.findall(token.lower())}
+            else:
+                self._words = set(WORD_RE.findall(self.original.lower()))
+        return self._words
+
+    @property
+    def rewrite_sites(self):
+        if self._sites is None:
+            self._sites = self._pipeline.matcher.scan(self.text)
+        return self._sites
+
+    @property
+    def pattern_matches(self):
+        if self._matches is None:
+            self._matches = self._pipeline.automaton.scan(self.tagged)
+        return self._matches
+
+    @property
+    def token_count(self):
+        # Whitespace count when the sentence has not been tokenized yet
+        if self._tokens is not None:
+            return len(self._tokens)
+        return len(self.original.split())
+
+    def touches(self, rule, words):
+        """True if the edited `words` contain one of the rule's triggers (or it declares none)."""
+        if not (rule.triggers or rule.tags):
+            return True
+        if not rule.triggers.isdisjoint(words):
+            return True
+        return bool(rule.tags) and any(
+            tag in rule.tags for word, tag in self.tagged if word.lower() in words
+        )
+
+    def can_trigger(self, rule):
+        """False if none of the rule's trigger words or tags occur in the sentence."""
+        if not (rule.triggers or rule.tags):
+            return True
+        if rule.triggers:
+            if self._word_triggered is None:
+                self._word_triggered = self._pipeline.trigger_index.match_words(self.words)
+            if rule.name in self._word_triggered:
+                return True
+        if rule.tags:
+            if self._tag_triggered is None:
+                self._tag_triggered = self._pipeline.trigger_index.match_tags(self.tagged)
+            if rule.name in self._tag_triggered:
+                return True
+        return False
+
+    def apply_edits(self, rule_name, edits):
+        """
+        Apply a rule's non-overlapping `(start, end, replacement_tokens)` edits
+        and record them; return True if the tokens changed. Replacement tokens
+        equal to a token they replace keep its input span.
+        """
+        tokens = list(self.tokens)
+        spans = list(self.spans)
+        applied = []
+        for start, end, replacement in sorted(edits, key=lambda edit: edit[0], reverse=True):
+            replacement = list(replacement)
+            if tokens[start:end] == replacement:
+                continue
+            region = _covering_span(spans, start, end)
+            available = list(zip(tokens[start:end], spans[start:end]))
+            new_spans = []
+            for token in replacement:
+                for k, (old_token, old_span) in enumerate(available):
+                    if old_token == token and old_span is not None:
+                        new_spans.append(old_span)
+                        del available[k]
+                        break
+                else:
+                    new_spans.append((region[0], region[1], False))
+            tokens[start:end] = replacement
+            spans[start:end] = new_spans
+            applied.append(RuleEdit(rule_name, region[0], region[1],
+                                    self.original[region[0]:region[1]], ' '.join(replacement)))
+            if self._pipeline.fixpoint:
+                window = tokens[max(0, start - 3):start + len(replacement) + 3]
+                self.touched.update(word for token in window for word in WORD_RE.findall(token.lower()))
+        if not applied:
+            return False
+        self.edits.extend(reversed(applied))
+        self._tokens = tokens
+        self._spans = spans
+        self._tagged = None
+        self._reset_derived()
+        return True
+
+    def replace_text(self, rule_name, text):
+        """
+        Apply a text-level rewrite: re-tokenize `text` and turn the tokens that
+        differ from the current ones into a single edit.
+        """
+        old_tokens = self.tokens
+        new_tokens = self._pipeline.tokenize(text)
+        prefix = 0
+        limit = min(len(old_tokens), len(new_tokens))
+        while prefix < limit and old_tokens[prefix] == new_tokens[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < limit - prefix and old_tokens[-1 - suffix] == new_tokens[-1 - suffix]:
+            suffix += 1
+        edit = (prefix, len(old_tokens) - suffix, new_tokens[prefix:len(new_tokens) - suffix])
+        return self.apply_edits(rule_name, [edit])
+
+    def output(self):
+        """The reconstructed sentence: `text` with closing punctuation attached."""
+        return clean_spacing(self.text)
 
 class Rule:
-    def __init__(self, name, apply_func):
+    """
+    Rule over the sentence text: `apply_func(text) -> text`. The pipeline
+    turns the rewritten text into token edits.
+
+    `triggers` (words) and `tags` (POS tags) are optional: when given, the
+    pipeline only runs the rule on sentences containing at least one of them.
+    Trigger words are matched against the sentence's lowercased word-character
+    runs, so only declare words the rule needs to see as whole words.
+    """
+    def __init__(self, name, apply_func, triggers=None, tags=None):
         self.name = name
         self.apply = apply_func
+        self.triggers = frozenset(word.lower() for word in triggers or ())
+        self.tags = frozenset(tags or ())
+
+    def run(self, stream):
+        text = stream.text
+        new_sentence = self.apply(text)
+        return new_sentence != text and stream.replace_text(self.name, new_sentence)
+
+class TokenRule(Rule):
+    """Rule over the tagged tokens: `apply_func(tagged) -> [(start, end, replacement_tokens), ...]`."""
+    def run(self, stream):
+        edits = self.apply(stream.tagged)
+        return bool(edits) and stream.apply_edits(self.name, edits)
+
+class RegexRule(Rule):
+    """
+    Rule given as `(pattern, replacement)` pairs instead of a function. The
+    replacement is a string, a dict keyed by the lowercased match, or a
+    callable on the matched text. Rewrite sites come from the pipeline's
+    shared RewriteMatcher, so the rule does no scanning of its own; sites
+    that line up with token boundaries become token edits directly, others
+    fall back to a text-level rewrite.
+    """
+    def __init__(self, name, patterns, first_pattern_only=False, triggers=None):
+        super().__init__(name, None, triggers=triggers)
+        self.patterns = patterns
+        self.first_pattern_only = first_pattern_only
+
+    def run(self, stream):
+        sites = stream.rewrite_sites.get(self.name)
+        if not sites:
+            return False
+        if self.first_pattern_only:
+            first = min(site[0] for site in sites)
+            sites = [site for site in sites if site[0] == first]
+
+        offsets = stream.text_offsets()
+        starts = {offset[0]: i for i, offset in enumerate(offsets) if offset is not None}
+        ends = {offset[1]: i + 1 for i, offset in enumerate(offsets) if offset is not None}
+        edits = []
+        for _, start, end, replacement in sites:
+            if start not in starts or end not in ends:
+                return self._rewrite_text(stream, sites)
+            edits.append((starts[start], ends[end], stream.tokenize(replacement)))
+        return stream.apply_edits(self.name, edits)
+
+    def _rewrite_text(self, stream, sites):
+        text = stream.text
+        pieces = []
+        last = 0
+        for _, start, end, replacement in sites:
+            pieces.append(text[last:start])
+            pieces.append(replacement)
+            last = end
+        pieces.append(text[last:])
+        new_sentence = ''.join(pieces)
+        return new_sentence != text and stream.replace_text(self.name, new_sentence)
+
+class PhraseRule(RegexRule):
+    """RegexRule for a literal `{phrase: replacement}` dictionary, matched case-insensitively."""
+    def __init__(self, name, phrases):
+        super().__init__(name, [(phrase_trie_pattern(phrases), phrases)])
+
+class RewriteMatcher:
+    """
+    The patterns of every RegexRule compiled into one case-insensitive
+    alternation. `scan` finds all rewrite sites of all rules in one pass and
+    groups them by rule name as `(pattern_index, start, end, replacement)`.
+    Sites of different rules are not expected to overlap; if they do, the
+    leftmost match in the text wins, as the scan moves left to right and
+    skips anything starting inside a match. Rule order only decides between
+    matches starting at the same position, so reordering rules does not
+    change precedence otherwise.
+    """
+    def __init__(self, rules):
+        self._entries = {}
+        alternatives = []
+        for rule in rules:
+            for index, (pattern, replacement) in enumerate(rule.patterns):
+                group = f"r{len(self._entries)}"
+                self._entries[group] = (rule.name, index, replacement)
+                alternatives.append(f"(?P<{group}>{pattern})")
+        self._regex = re.compile('|'.join(alternatives), re.IGNORECASE) if alternatives else None
+
+    def scan(self, text):
+        sites = {}
+        if self._regex is None:
+            return sites
+        for match in self._regex.finditer(text):
+            name, index, replacement = self._entries[match.lastgroup]
+            matched = match.group()
+            if isinstance(replacement, dict):
+                replacement = replacement[matched.lower()]
+            elif callable(replacement):
+                replacement = replacement(matched)
+            sites.setdefault(name, []).append((index, match.start(), match.end(), replacement))
+        return sites
+
+class Tok:
+    """
+    One position of a TagPatternRule: an optional set of (lowercase) words and
+    an optional POS tag, where a tag ending in '*' matches as a prefix.
+    """
+    def __init__(self, words=None, tag=None):
+        self.words = frozenset(words) if words is not None else None
+        self.tag = tag
+
+    def matches(self, lower_word, tag):
+        if self.words is not None and lower_word not in self.words:
+            return False
+        if self.tag is None:
+            return True
+        if self.tag.endswith('*'):
+            return tag.startswith(self.tag[:-1])
+        return tag == self.tag
+
+class TagPatternRule(Rule):
+    """
+    Rule declared as a window of `Tok`s over the tagged tokens plus a
+    `rewrite(window) -> tokens` function. Matches come from the pipeline's
+    shared TagPatternAutomaton; the rule rewrites them greedily from the left
+    without overlap.
+    """
+    def __init__(self, name, pattern, rewrite, triggers=None, tags=None):
+        super().__init__(name, None, triggers=triggers, tags=tags)
+        self.pattern = pattern
+        self.rewrite = rewrite
+
+    def run(self, stream):
+        matches = stream.pattern_matches.get(self.name)
+        if not matches:
+            return False
+        tagged = stream.tagged
+        edits = []
+        last_end = 0
+        for start, end in matches:
+            if start >= last_end:
+                edits.append((start, end, self.rewrite(tagged[start:end])))
+                last_end = end
+        return stream.apply_edits(self.name, edits)
+
+class TagPatternAutomaton:
+    """
+    The patterns of every TagPatternRule run as one automaton over the
+    (word, tag) sequence. `scan` walks the sentence once, advancing all
+    partial matches at each token and starting new ones through an index on
+    the patterns' first positions, and returns every complete match grouped
+    by rule name as `(start, end)` token spans in order.
+    """
+    def __init__(self, rules):
+        self._patterns = [(rule.name, rule.pattern) for rule in rules if rule.pattern]
+        self._start_by_word = {}
+        self._start_by_tag = {}
+        self._start_by_prefix = {}
+        self._start_any = []
+        for index, (_, pattern) in enumerate(self._patterns):
+            first = pattern[0]
+            if first.words is not None:
+                for word in first.words:
+                    self._start_by_word.setdefault(word, []).append(index)
+            elif first.tag is None:
+                self._start_any.append(index)
+            elif first.tag.endswith('*'):
+                self._start_by_prefix.setdefault(first.tag[:-1], []).append(index)
+            else:
+                self._start_by_tag.setdefault(first.tag, []).append(index)
+
+    def _starting(self, lower_word, tag):
+        starting = list(self._start_any)
+        starting.extend(self._start_by_word.get(lower_word, ()))
+        starting.extend(self._start_by_tag.get(tag, ()))
+        for prefix, indices in self._start_by_prefix.items():
+            if tag.startswith(prefix):
+                starting.extend(indices)
+        return starting
+
+    def scan(self, tagged):
+        matches = {}
+        active = []  # (pattern index, next position, start token)
+        for i, (word, tag) in enumerate(tagged):
+            lower_word = word.lower()
+            candidates = active + [(index, 0, i) for index in self._starting(lower_word, tag)]
+            active = []
+            for index, position, start in candidates:
+                name, pattern = self._patterns[index]
+                if not pattern[position].matches(lower_word, tag):
+                    continue
+                if position + 1 == len(pattern):
+                    matches.setdefault(name, []).append((start, i + 1))
+                else:
+                    active.append((index, position + 1, start))
+        return matches
 
-    def run(self, sentence):
-        new_sentence = self.apply(sentence)
-        triggered = new_sentence != sentence
-        return new_sentence, triggered
+class TriggerIndex:
+    """Inverted index from trigger words and POS tags to the names of the rules declaring them."""
+    def __init__(self, rules):
+        self.by_word = {}
+        self.by_tag = {}
+        for rule in rules:
+            for word in rule.triggers:
+                self.by_word.setdefault(word, set()).add(rule.name)
+            for tag in rule.tags:
+                self.by_tag.setdefault(tag, set()).add(rule.name)
+
+    def match_words(self, words):
+        names = set()
+        for word in words:
+            names.update(self.by_word.get(word, ()))
+        return names
+
+    def match_tags(self, tagged):
+        names = set()
+        for tag in {tag for _, tag in tagged}:
+            names.update(self.by_tag.get(tag, ()))
+        return names
+
+class RuleStats:
+    """
+    Per-rule call and trigger counts, tokens processed and wall time of
+    `Rule.run`. Lazy tokenizing/tagging is charged to the first rule that
+    needs it. Stats from several pipelines (e.g. pool workers) can be merged.
+    """
+    def __init__(self):
+        self.calls = Counter()
+        self.triggers = Counter()
+        self.tokens = Counter()
+        self.durations = {}
+
+    def record(self, name, seconds, triggered, tokens):
+        self.calls[name] += 1
+        self.triggers[name] += triggered
+        self.tokens[name] += tokens
+        if name not in self.durations:
+            self.durations[name] = array('d')
+        self.durations[name].append(seconds)
+
+    def merge(self, other):
+        self.calls.update(other.calls)
+        self.triggers.update(other.triggers)
+        self.tokens.update(other.tokens)
+        for name, durations in other.durations.items():
+            self.durations.setdefault(name, array('d')).extend(durations)
+
+    def summary(self, skip_counts=None, names=None):
+        summary = {}
+        for name in names if names is not None else self.durations:
+            ordered = sorted(self.durations.get(name, ()))
+            summary[name] = {
+                "calls": self.calls[name],
+                "triggers": self.triggers[name],
+                "skipped": (skip_counts or {}).get(name, 0),
+                "tokens": self.tokens[name],
+                "total_ms": sum(ordered) * 1000,
+                "p50_ms": _percentile(ordered, 50) * 1000,
+                "p99_ms": _percentile(ordered, 99) * 1000,
+            }
+        return summary
 
 class ReconstructionPipeline:
-    def __init__(self, rules):
+    """
+    Applies `rules` in order to each sentence. With `fixpoint=True`, rules
+    are re-applied for up to `max_passes` passes: after each pass, only rules
+    whose triggers occur around the edits made in that pass (rules without
+    triggers: after any edit) run again, until a pass changes nothing.
+
+    With a `cache` (ReconstructionCache), sentences are whitespace-normalised
+    and looked up under the fingerprint of the current rules and settings
+    before being reconstructed.
+    """
+    def __init__(self, rules, tagger=None, offline=None, fixpoint=False, max_passes=3, cache=None):
         self.rules = rules
-
-    def reconstruct(self, sentence):
+        self.fixpoint = fixpoint
+        self.max_passes = max_passes
+        self.cache = cache
+        self._fingerprint = (None, None)
+        # One tagger per pipeline (nltk.pos_tag rebuilds it on every call),
+        # loaded with the tokenizer on the first reconstruct call
+        self.tagger = tagger
+        self.tokenize = None
+        self.offline = offline
+        self.matcher = RewriteMatcher([rule for rule in rules if isinstance(rule, RegexRule)])
+        self.automaton = TagPatternAutomaton([rule for rule in rules if isinstance(rule, TagPatternRule)])
+        self.trigger_index = TriggerIndex(rules)
+        # Rule name -> number of sentences on which it was skipped by the index
+        self.skip_counts = Counter()
+        # RuleStats while instrumented, None otherwise (see `instrument`)
+        self.stats = None
+
+    def instrument(self, enabled=True):
+        """Switch per-rule timing on (with fresh stats) or off."""
+        self.stats = RuleStats() if enabled else None
+
+    def dump_stats(self, path):
+        """Write the per-rule stats collected so far as JSON."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.stats.summary(self.skip_counts, [rule.name for rule in self.rules]), f, indent=2)
+
+    def __getstate__(self):
+        # Sent to pool workers: they load their own NLTK resources and start
+        # with empty counters that the parent merges back chunk by chunk
+        state = self.__dict__.copy()
+        if _nltk_tools is not None and state["tagger"] is _nltk_tools[1]:
+            state["tagger"] = None
+        state["tokenize"] = None
+        state["skip_counts"] = Counter()
+        return state
+
+    @property
+    def fingerprint(self):
+        """Hash of the rules and settings that determine outputs (recomputed when they change)."""
+        config = (tuple(id(rule) for rule in self.rules), self.fixpoint, self.max_passes)
+        if self._fingerprint[0] != config:
+            self._fingerprint = (config, rules_fingerprint(self.rules, self.fixpoint, self.max_passes))
+        return self._fingerprint[1]
+
+    def load_resources(self):
+        tokenize, tagger = load_nltk_resources(self.offline)
+        self.tokenize = tokenize
+        if self.tagger is None:
+            self.tagger = tagger
+
+    def reconstruct(self, sentence, tagged=None):
+        if self.cache is None:
+            return self._reconstruct(sentence, tagged)
+        sentence = normalize_sentence(sentence)
+        cached = self.cache.get(self.fingerprint, sentence)
+        if cached is not None:
+            return cached
+        output, applied_rules = self._reconstruct(sentence, tagged)
+        self.cache.put(self.fingerprint, sentence, output, applied_rules)
+        return output, applied_rules
+
+    def trace(self, sentence):
+        """
+        Reconstruct one sentence without the cache and return the output with
+        its provenance: the RuleEdit list, in the order the edits were made.
+        """
+        stream, _ = self._run(sentence)
+        return stream.output(), stream.edits
+
+    def _reconstruct(self, sentence, tagged=None):
+        stream, applied_rules = self._run(sentence, tagged)
+        return stream.output(), applied_rules
+
+    def _run(self, sentence, tagged=None):
+        if self.tokenize is None:
+            self.load_resources()
+        stream = TokenStream(sentence, self, tagged)
         applied_rules = []
-        for rule in self.rules:
-            sentence_new, triggered = rule.run(sentence)
+        self._run_pass(stream, self.rules, applied_rules)
+        if self.fixpoint:
+            for _ in range(self.max_passes - 1):
+                if not stream.touched:
+                    break
+                touched, stream.touched = stream.touched, set()
+                rerun = [rule for rule in self.rules if stream.touches(rule, touched)]
+                self._run_pass(stream, rerun, applied_rules)
+        return stream, applied_rules
+
+    def _run_pass(self, stream, rules, applied_rules):
+        """Run `rules` once over the stream, appending the names of those that fired."""
+        stats = self.stats
+        for rule in rules:
+            if not stream.can_trigger(rule):
+                self.skip_counts[rule.name] += 1
+                continue
+            if stats is None:
+                triggered = rule.run(stream)
+            else:
+                start = time.perf_counter()
+                triggered = rule.run(stream)
+                stats.record(rule.name, time.perf_counter() - start, triggered, stream.token_count)
             if triggered:
                 applied_rules.append(rule.name)
-                sentence = sentence_new
-        return clean_spacing(sentence), applied_rules
+
+    def reorder_rules(self, summary=None):
+        """
+        Reorder the rules from collected stats (a RuleStats summary, e.g. a
+        JSON file from `dump_stats`; default: this pipeline's own stats).
+        Rules that rarely fire go first, so the shared token and tag views
+        stay valid for longer, and cheaper rules go first among equals.
+        Reordering can change outputs where rules interact, so it is best
+        combined with fixpoint mode.
+        """
+        if summary is None:
+            summary = self.stats.summary(self.skip_counts, [rule.name for rule in self.rules])
+
+        def cost(rule):
+            entry = summary.get(rule.name)
+            seen = entry["calls"] + entry["skipped"] if entry else 0
+            if not seen:
+                return (0.0, 0.0)
+            return (entry["triggers"] / seen, entry["total_ms"] / seen)
+
+        self.rules = sorted(self.rules, key=cost)
+        return [rule.name for rule in self.rules]
+
+    def reconstruct_batch(self, sentences):
+        """Reconstruct a list of sentences, POS-tagging them as one batch."""
+        if self.tokenize is None:
+            self.load_resources()
+        if self.cache is None:
+            tagged_sents = self.tagger.tag_sents([self.tokenize(s) for s in sentences])
+            return [self._reconstruct(s, tagged) for s, tagged in zip(sentences, tagged_sents)]
+
+        # Each distinct sentence is looked up once (repeats count as hits);
+        # only the misses are tagged and reconstructed
+        fingerprint = self.fingerprint
+        sentences = [normalize_sentence(s) for s in sentences]
+        results = {s: self.cache.get(fingerprint, s) for s in dict.fromkeys(sentences)}
+        self.cache.counts["hits"] += len(sentences) - len(results)
+        misses = [s for s, result in results.items() if result is None]
+        tagged_sents = self.tagger.tag_sents([self.tokenize(s) for s in misses])
+        for sentence, tagged in zip(misses, tagged_sents):
+            results[sentence] = self._reconstruct(sentence, tagged)
+            self.cache.put(fingerprint, sentence, *results[sentence])
+        self.cache.flush()
+        return [results[s] for s in sentences]
+
+    def reconstruct_many(self, sentences, workers=1, chunksize=512):
+        """
+        Yield `(output, applied_rules)` for every sentence of an iterable, in
+        input order. Sentences are tagged in chunks of `chunksize`; with
+        `workers > 1` the chunks are spread over a process pool whose workers
+        each load the NLTK tagger once at startup.
+        """
+        chunks = _chunked(sentences, chunksize)
+        if workers <= 1:
+            for chunk in chunks:
+                yield from self.reconstruct_batch(chunk)
+            return
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(self,)) as pool:
+            for results, skip_counts, stats, cache_counts in pool.imap(_reconstruct_chunk, chunks):
+                self.skip_counts.update(skip_counts)
+                if self.stats is not None:
+                    self.stats.merge(stats)
+                if self.cache is not None:
+                    self.cache.counts.update(cache_counts)
+                yield from results
+
+# === Batch Workers ===
+
+_worker_pipeline = None
+
+def _init_worker(pipeline):
+    global _worker_pipeline
+    _worker_pipeline = pipeline
+    _worker_pipeline.load_resources()
+
+def _reconstruct_chunk(chunk):
+    # Counters are reset per chunk; the parent process merges them
+    pipeline = _worker_pipeline
+    pipeline.skip_counts.clear()
+    pipeline.instrument(pipeline.stats is not None)
+    cache_counts = Counter()
+    if pipeline.cache is not None:
+        pipeline.cache.counts.clear()
+        cache_counts = pipeline.cache.counts
+    return pipeline.reconstruct_batch(chunk), pipeline.skip_counts, pipeline.stats, cache_counts
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
 
 # === Util ===
 
+WORD_RE = re.compile(r'\w+')
+
+def measure_import_time():
+    """Seconds a fresh interpreter takes to import this module."""
+    import subprocess
+
+    module = os.path.splitext(os.path.basename(__file__))[0]
+    code = (
+        "import sys, time; sys.path.insert(0, sys.argv[1]); start = time.perf_counter(); "
+        f"import {module}; print(time.perf_counter() - start)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code, os.path.dirname(os.path.abspath(__file__))],
+        capture_output=True, text=True, check=True,
+    )
+    return float(result.stdout)
+
+def _percentile(ordered, percent):
+    if not ordered:
+        return 0.0
+    rank = max(0, -(-len(ordered) * percent // 100) - 1)  # nearest rank
+    return ordered[int(rank)]
+
+def rules_fingerprint(rules, *settings):
+    """
+    SHA-256 over the rule list (order, names, triggers, patterns), `settings`,
+    and the source of every module defining a rule function, so that editing
+    any rule yields a new fingerprint.
+    """
+    digest = hashlib.sha256(repr(settings).encode())
+    modules = set()
+    for rule in rules:
+        parts = [type(rule).__name__, rule.name, sorted(rule.triggers), sorted(rule.tags)]
+        for pattern, replacement in getattr(rule, "patterns", ()):
+            if callable(replacement):
+                replacement = replacement.__qualname__
+            elif isinstance(replacement, dict):
+                replacement = sorted(replacement.items())
+            parts.append((pattern, replacement))
+        for tok in getattr(rule, "pattern", ()):
+            parts.append((sorted(tok.words) if tok.words is not None else None, tok.tag))
+        digest.update(repr(parts).encode())
+        for func in (rule.apply, getattr(rule, "rewrite", None)):
+            module = inspect.getmodule(func) if func is not None else None
+            if module is not None:
+                modules.add(module)
+    for module in sorted(modules, key=lambda m: m.__name__):
+        try:
+            digest.update(inspect.getsource(module).encode())
+        except (OSError, TypeError):
+            digest.update(module.__name__.encode())
+    return digest.hexdigest()
+
 def clean_spacing(text):
     return re.sub(r'\s+([.,!?;:])', r'\1', text)
 
-# === General and Specific Rules ===
+# NLTK's word_tokenize rewrites double quotes as `` and ''
+QUOTE_TOKENS = {'``': ('``', '"'), "''": ("''", '"')}
+
+def align_tokens(tokens, text):
+    """
+    `(start, end, True)` span of every token in `text`, or None for a token
+    that cannot be found right after the previous one (only whitespace in
+    between).
+    """
+    spans = []
+    position = 0
+    for token in tokens:
+        span = None
+        for form in QUOTE_TOKENS.get(token, (token,)):
+            start = text.find(form, position)
+            if start >= 0 and not text[position:start].strip():
+                span = (start, start + len(form), True)
+                position = start + len(form)
+                break
+        spans.append(span)
+    return spans
+
+def _covering_span(spans, start, end):
+    """Input character span of tokens `start:end` (an empty span at the nearest known offset for insertions)."""
+    located = [span for span in spans[start:end] if span is not None]
+    if located:
+        return min(span[0] for span in located), max(span[1] for span in located)
+    before = [span for span in spans[:start] if span is not None]
+    offset = before[-1][1] if before else 0
+    return offset, offset
+
+def detokenize(tokens, spans, original):
+    """
+    Join tokens back into text, one space between tokens. Tokens kept
+    verbatim are copied from `original`, and two such tokens that were
+    adjacent there stay adjacent (so "don't" or "(see)" come back unchanged).
+    Returns the text and the `(start, end)` of every token within it.
+    """
+    pieces = []
+    offsets = []
+    position = 0
+    previous = None
+    for token, span in zip(tokens, spans):
+        verbatim = span is not None and span[2]
+        if pieces:
+            gap = ' '
+            if verbatim and previous is not None and previous[2] and previous[1] == span[0]:
+                gap = ''
+            pieces.append(gap)
+            position += len(gap)
+        piece = original[span[0]:span[1]] if verbatim else token
+        pieces.append(piece)
+        offsets.append((position, position + len(piece)))
+        position += len(piece)
+        previous = span
+    return ''.join(pieces), offsets
+
+def phrase_trie_pattern(phrases):
+    """
+    Regex source matching any of `phrases` (lowercase), factored by common
+    prefixes so the engine walks a trie at each position instead of trying
+    every phrase in turn. Longer phrases win over their prefixes.
+    """
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase.lower():
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def to_regex(node):
+        branches = [re.escape(char) + to_regex(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return '(?:' + body + ')?' if '' in node else body
+
+    return to_regex(trie)
 
-def add_missing_subject(sentence):
-    if re.match(r'^(Hope|Want|Need|Wish)\b', sentence, re.IGNORECASE):
-        return "I " + sentence[0].lower() + sentence[1:]
-    return sentence
+# === General and Specific Rules ===
 
 def remove_duplicate_words(sentence):
     words = sentence.split()
@@ -61,45 +895,54 @@ def remove_duplicate_words(sentence):
             cleaned.append(word)
     return ' '.join(cleaned)
 
-def clarify_contract_checking(sentence):
-    """[Regex] Rewrite domain-specific collocations like 'contract checking' → 'contract review'"""
-    replacements = {
-        "contract checking": "contract review",
-        "document check": "document review",
-        "paper correction": "paper revision"
-    }
-    lower_sentence = sentence.lower()
-    for phrase, replacement in replacements.items():
-        if phrase in lower_sentence:
-            sentence = re.sub(re.escape(phrase), replacement, sentence, flags=re.IGNORECASE)
-    return sentence
-
-def fix_verb_editing_construction(sentence):
-    return re.sub(r'plans (for|on) the editing', 'plans to edit', sentence, flags=re.IGNORECASE)
-
-def simplify_final_wishes_phrase(sentence):
-    """[Regex] Generalize 'which is one of my final wishes' → 'as I had hoped'"""
-    patterns = [
-        r'which is one of my (final|sincere|strong) wishes',
-        r'that is one of my (final|sincere|strong) wishes',
-        r'which I (sincerely|truly)? ?wish(ed)? for',
-        r'which I (have)? ?been wishing for',
-    ]
-    replacement = 'as I had hoped'
-    new_sentence = sentence
-    for pattern in patterns:
-        new_sentence, count = re.subn(pattern, replacement, new_sentence, flags=re.IGNORECASE)
-        if count > 0:
-            break
-    return new_sentence
+def missing_subject(match):
+    """[Regex] 'Hope you ...' → 'I hope you ...'"""
+    return "I " + match[0].lower() + match[1:]
+
+# [Regex] Rewrite domain-specific collocations like 'contract checking' → 'contract review'
+CONTRACT_PHRASES = {
+    "contract checking": "contract review",
+    "document check": "document review",
+    "paper correction": "paper revision"
+}
+
+# [Regex] Generalize 'which is one of my final wishes' → 'as I had hoped'
+# (only the first pattern that matches is applied)
+FINAL_WISHES_PATTERNS = [
+    r'which is one of my (final|sincere|strong) wishes',
+    r'that is one of my (final|sincere|strong) wishes',
+    r'which I (sincerely|truly)? ?wish(ed)? for',
+    r'which I (have)? ?been wishing for',
+]
+
 # === NLTK-Enhanced Rules ===
+# Each takes the pipeline's shared `tagged` list of (word, tag) pairs and
+# returns a list of `(start, end, replacement_tokens)` edits (empty when it
+# leaves the sentence alone), as TokenRule expects.
 
-def fix_subject_verb_agreement_nltk(sentence):
-    from nltk import word_tokenize, pos_tag
+SINGULAR_SUBJECTS = {'he', 'she', 'it', 'doctor'}
 
-    tokens = word_tokenize(sentence)
-    tagged = pos_tag(tokens)
-    modified = False
+NOMINALIZED_ACTIONS = {"edit", "review", "check", "submission", "approval", "revision", "update"}
+
+REDUNDANT_PAIRS = {
+    ("finalized", "approved"),
+    ("confirmed", "approved"),
+    ("confirmed", "checked"),
+    ("verified", "checked"),
+    ("fully", "complete"),
+    ("completely", "finished"),
+}
+
+AMBIGUOUS_ROOTS = {
+    "edit", "review", "check", "submit", "update", "approve", "correct", "revise"
+}
+
+POLITENESS_MARKERS = {'kindly', 'please'}
+
+FILLER_STARTERS = {"actually", "basically", "i mean", "you know", "in fact"}
+
+def fix_subject_verb_agreement_nltk(tagged):
+    edits = []
 
     skip_tags = {'RB', 'RBR', 'RBS'}  # adverbs
     common_base_verbs = {"plan", "check", "edit", "review", "submit"}
@@ -108,7 +951,7 @@ def fix_subject_verb_agreement_nltk(sentence):
     while i < len(tagged) - 1:
         word1, tag1 = tagged[i]
 
-        if tag1 in ('NN', 'PRP') and word1.lower() in ('he', 'she', 'it', 'doctor'):
+        if tag1 in ('NN', 'PRP') and word1.lower() in SINGULAR_SUBJECTS:
             for j in range(i + 1, min(i + 4, len(tagged))):
                 word2, tag2 = tagged[j]
 
@@ -116,82 +959,25 @@ def fix_subject_verb_agreement_nltk(sentence):
                     continue
 
                 if tag2 == 'VB':
-                    tokens[j] = word2 + 's'
-                    modified = True
+                    edits.append((j, j + 1, [word2 + 's']))
                     break
 
                 elif tag2 == 'VBG' and word2.endswith('ing'):
-                    tokens[j] = word2[:-3] + 's'
-                    modified = True
+                    edits.append((j, j + 1, [word2[:-3] + 's']))
                     break
 
                 elif tag2 == 'NN' and word2.lower() in common_base_verbs:
-                    tokens[j] = word2 + 's'
-                    modified = True
+                    edits.append((j, j + 1, [word2 + 's']))
                     break
 
                 break
 
         i += 1
 
-    return ' '.join(tokens) if modified else sentence
-
-def fix_noun_modifier_order_nltk(sentence):
-    from nltk import word_tokenize, pos_tag
-
-    tokens = word_tokenize(sentence)
-    tagged = pos_tag(tokens)
-    modified = False
-
-    transformed = []
-
-    i = 0
-    while i < len(tagged) - 2:
-        t1, t2, t3 = tagged[i:i+3]
-        word1, tag1 = t1
-        word2, tag2 = t2
-        word3, tag3 = t3
-
-        if tag1.startswith('NN') and tag2.startswith('NN') and tag3.startswith('NN'):
-            if word3.lower() in {"edit", "review", "check", "submission", "approval", "revision", "update"}:
-                # Make gerund form safely
-                if word3.endswith('e'):
-                    verbing = word3[:-1] + 'ing'
-                else:
-                    verbing = word3 + 'ing'
-
-                transformed.append((i, i + 3, f"{verbing} the {word1} {word2}"))
-                i += 3
-                modified = True
-                continue
-        i += 1
-
-    if not modified:
-        return sentence
-
-    new_tokens = tokens[:]
-    for start, end, repl in reversed(transformed):
-        new_tokens[start:end] = [repl]
-
-    return ' '.join(new_tokens)
+    return edits
 
-def compress_overqualified_nouns_ntlk(sentence):
-    from nltk import word_tokenize, pos_tag
-
-    tokens = word_tokenize(sentence)
-    tagged = pos_tag(tokens)
-    modified = False
-
-    redundant_pairs = {
-        ("finalized", "approved"),
-        ("confirmed", "approved"),
-        ("confirmed", "checked"),
-        ("verified", "checked"),
-        ("fully", "complete"),
-        ("completely", "finished"),
-    }
-
-    new_tokens = []
+def compress_overqualified_nouns_ntlk(tagged):
+    edits = []
     i = 0
     while i < len(tagged) - 1:
         word1, tag1 = tagged[i]
@@ -199,207 +985,155 @@ def compress_overqualified_nouns_ntlk(sentence):
 
         lower_pair = (word1.lower(), word2.lower())
 
-        if lower_pair in redundant_pairs:
-            new_tokens.append(word2)  # keep only the second word
+        if lower_pair in REDUNDANT_PAIRS:
+            edits.append((i, i + 2, [word2]))  # keep only the second word
             i += 2
-            modified = True
         else:
-            new_tokens.append(word1)
             i += 1
 
-    if i == len(tagged) - 1:
-        new_tokens.append(tagged[-1][0])  # add last word if not processed
-
-    return ' '.join(new_tokens) if modified else sentence
-
-def disambiguate_nominal_verb_noun_nltk(sentence):
-    from nltk import word_tokenize, pos_tag
+    return edits
 
-    tokens = word_tokenize(sentence)
-    tagged = pos_tag(tokens)
-    modified = False
-
-    ambiguous_roots = {
-        "edit", "review", "check", "submit", "update", "approve", "correct", "revise"
-    }
-
-    disambiguated = []
-
-    i = 0
-    while i < len(tagged) - 1:
-        word1, tag1 = tagged[i]
-        word2, tag2 = tagged[i + 1]
-
-        if tag1 == 'NN' and tag2 == 'NN' and word1.lower() in ambiguous_roots:
-            # Convert root verb to -ing form
-            if word1.endswith('e'):
-                verbing = word1[:-1] + 'ing'
-            else:
-                verbing = word1 + 'ing'
-
-            disambiguated.append((i, i + 2, f"{verbing} {word2}"))
-            i += 2
-            modified = True
-        else:
-            i += 1
-
-    if not modified:
-        return sentence
-
-    new_tokens = tokens[:]
-    for start, end, repl in reversed(disambiguated):
-        new_tokens[start:end] = [repl]
-
-    return ' '.join(new_tokens)
-
-def shorten_double_modals_nltk(sentence):
-    from nltk import word_tokenize, pos_tag
-    """[NLTK] Remove redundant modal pairs like 'might can' → 'can'"""
-    tokens = word_tokenize(sentence)
-    tagged = pos_tag(tokens)
-    modified = False
-    new_tokens = []
-    i = 0
-    while i < len(tagged) - 1:
-        word1, tag1 = tagged[i]
-        word2, tag2 = tagged[i + 1]
-        if tag1 == 'MD' and tag2 == 'MD':
-            new_tokens.append(word2)
-            i += 2
-            modified = True
-        else:
-            new_tokens.append(word1)
-            i += 1
-    if i == len(tagged) - 1:
-        new_tokens.append(tagged[-1][0])
-    return ' '.join(new_tokens) if modified else sentence
-
-def simplify_politeness_nltk(sentence):
+def simplify_politeness_nltk(tagged):
     """[NLTK] Simplify excessive politeness like 'kindly please' → 'please'"""
-    tokens = word_tokenize(sentence)
-    tagged = pos_tag(tokens)
-    filtered_tokens = []
-    modified = False
+    edits = []
     seen_please = False
-    for word, tag in tagged:
-        if word.lower() in {'kindly', 'please'}:
+    for i, (word, tag) in enumerate(tagged):
+        if word.lower() in POLITENESS_MARKERS:
             if seen_please:
-                modified = True
+                edits.append((i, i + 1, []))
                 continue
             seen_please = True
-            filtered_tokens.append("please")
-            modified = True
-        else:
-            filtered_tokens.append(word)
-    return ' '.join(filtered_tokens) if modified else sentence
+            if word != "please":
+                edits.append((i, i + 1, ["please"]))
+    return edits
 
-def clean_fillers_nltk(sentence):
+def clean_fillers_nltk(tagged):
     """[NLTK] Remove fillers like 'actually', 'you know', 'in fact' from start of sentence"""
-    tokens = word_tokenize(sentence)
-    tagged = pos_tag(tokens)
-    modified = False
-    filler_starters = {"actually", "basically", "i mean", "you know", "in fact"}
-    cleaned_tokens = []
+    edits = []
     skip = False
     for i, (word, tag) in enumerate(tagged):
         lower_word = word.lower()
-        if lower_word in filler_starters and (i == 0 or tagged[i - 1][0] in {",", "."}):
-            modified = True
+        if lower_word in FILLER_STARTERS and (i == 0 or tagged[i - 1][0] in {",", "."}):
+            edits.append((i, i + 1, []))
             skip = True
             continue
         if skip and word in {",", "."}:
+            edits.append((i, i + 1, []))
             continue
         skip = False
-        cleaned_tokens.append(word)
-    return ' '.join(cleaned_tokens) if modified else sentence
+    return edits
 
-def fix_article_usage_nltk(sentence):
+def fix_article_usage_nltk(tagged):
     """[NLTK] Fix improper 'a/an' usage based on following noun's phonetics"""
-    tokens = word_tokenize(sentence)
-    tagged = pos_tag(tokens)
-    modified = False
-    new_tokens = []
-    for i in range(len(tagged)):
+    edits = []
+    for i in range(len(tagged) - 1):
         word, tag = tagged[i]
-        if word.lower() == 'a' and i + 1 < len(tagged):
+        if word.lower() == 'a':
             next_word, next_tag = tagged[i + 1]
             if next_tag.startswith('NN') and next_word[0].lower() in 'aeiou':
-                new_tokens.append('an')
-                modified = True
-            else:
-                new_tokens.append(word)
-        else:
-            new_tokens.append(word)
-    return ' '.join(new_tokens) if modified else sentence
+                edits.append((i, i + 1, ['an']))
+    return edits
+
+# === POS Pattern Rewrites ===
+# Rewrites for TagPatternRules: each gets the matched window of (word, tag)
+# pairs and returns the tokens replacing it.
+
+def gerund(word):
+    # Make gerund form safely
+    if word.endswith('e'):
+        return word[:-1] + 'ing'
+    return word + 'ing'
+
+def gerund_before_compound(window):
+    """[NLTK] 'acknowledgments section edit' → 'editing the acknowledgments section'"""
+    (word1, _), (word2, _), (word3, _) = window
+    return [gerund(word3), "the", word1, word2]
+
+def gerund_before_noun(window):
+    """[NLTK] Convert root verb to -ing form: 'edit section' → 'editing section'"""
+    (word1, _), (word2, _) = window
+    return [gerund(word1), word2]
+
+def keep_second_modal(window):
+    """[NLTK] Remove redundant modal pairs like 'might can' → 'can'"""
+    return [window[1][0]]
 
-def normalize_infinitives_nltk(sentence):
+def you_plus_verb(window):
     """[NLTK] Correct malformed infinitives like 'you too, to VB' → 'you VB'"""
-    tokens = word_tokenize(sentence)
-    tagged = pos_tag(tokens)
-    modified = False
-    new_tokens = []
-    i = 0
-    while i < len(tagged) - 3:
-        w1, t1 = tagged[i]
-        w2, t2 = tagged[i + 1]
-        w3, t3 = tagged[i + 2]
-        w4, t4 = tagged[i + 3]
-        if w1.lower() == 'you' and w2.lower() == 'too' and w3 in {',', 'to'} and t4 == 'VB':
-            new_tokens.extend(['you', w4])
-            i += 4
-            modified = True
-            continue
-        new_tokens.append(w1)
-        i += 1
-    while i < len(tagged):
-        new_tokens.append(tagged[i][0])
-        i += 1
-    return ' '.join(new_tokens) if modified else sentence
+    return ['you', window[3][0]]
 
-def fix_awkward_gratitude_nltk(sentence):
+def thank_you_for(window):
     """[NLTK] Transform 'Thank your message' → 'Thank you for the message'"""
-    tokens = word_tokenize(sentence)
-    tagged = pos_tag(tokens)
-    modified = False
-    new_tokens = []
-    i = 0
-    while i < len(tokens) - 2:
-        if tokens[i].lower() == 'thank' and tokens[i + 1].lower() in {'your', 'the'} and tagged[i + 2][1].startswith('NN'):
-            new_tokens.append('Thank')
-            new_tokens.extend(['you', 'for', 'the', tokens[i + 2]])
-            i += 3
-            modified = True
-        else:
-            new_tokens.append(tokens[i])
-            i += 1
-    while i < len(tokens):
-        new_tokens.append(tokens[i])
-        i += 1
-    return ' '.join(new_tokens) if modified else sentence
+    return ['Thank', 'you', 'for', 'the', window[2][0]]
 
 # === Rule Set ===
 
 rules = [
-    Rule("AddMissingSubject", add_missing_subject),
+    RegexRule("AddMissingSubject", [(r'^(Hope|Want|Need|Wish)\b', missing_subject)],
+              triggers={"hope", "want", "need", "wish"}),
     Rule("RemoveDuplicateWords", remove_duplicate_words),
-    Rule("SimplifyPolitenessNLTK", simplify_politeness_nltk),
-    Rule("FixArticlesNLTK", fix_article_usage_nltk),
-    Rule("ShortenDoubleModalsNLTK", shorten_double_modals_nltk),
-    Rule("CompressOverqualifiedNounsNLTK", compress_overqualified_nouns_ntlk),
-    Rule("FixAwkwardGratitudeNLTK", fix_awkward_gratitude_nltk),
-    Rule("ClarifyContractChecking", clarify_contract_checking),
-    Rule("SimplifyFinalWishes", simplify_final_wishes_phrase),
-    Rule("NormalizeInfinitivesNLTK", normalize_infinitives_nltk),
-    Rule("FixNounModifierOrderNLTK", fix_noun_modifier_order_nltk),
-    Rule("CleanFillersNLTK", clean_fillers_nltk),
-    Rule("FixEditingVerbConstruction", fix_verb_editing_construction),
-    Rule("FixVerbAgreementNLTK", fix_subject_verb_agreement_nltk),
-    Rule("DisambiguateNominalVerbNounNLTK", disambiguate_nominal_verb_noun_nltk),
+    TokenRule("SimplifyPolitenessNLTK", simplify_politeness_nltk, triggers=POLITENESS_MARKERS),
+    TokenRule("FixArticlesNLTK", fix_article_usage_nltk, triggers={"a"}),
+    TagPatternRule("ShortenDoubleModalsNLTK", [Tok(tag='MD'), Tok(tag='MD')], keep_second_modal,
+                   tags={"MD"}),
+    TokenRule("CompressOverqualifiedNounsNLTK", compress_overqualified_nouns_ntlk,
+              triggers={first for first, _ in REDUNDANT_PAIRS}),
+    TagPatternRule("FixAwkwardGratitudeNLTK",
+                   [Tok(words={'thank'}), Tok(words={'your', 'the'}), Tok(tag='NN*')], thank_you_for,
+                   triggers={"thank"}),
+    PhraseRule("ClarifyContractChecking", CONTRACT_PHRASES),
+    RegexRule("SimplifyFinalWishes", [(p, 'as I had hoped') for p in FINAL_WISHES_PATTERNS], first_pattern_only=True),
+    TagPatternRule("NormalizeInfinitivesNLTK",
+                   [Tok(words={'you'}), Tok(words={'too'}), Tok(words={',', 'to'}), Tok(tag='VB')], you_plus_verb,
+                   triggers={"too"}),
+    TagPatternRule("FixNounModifierOrderNLTK",
+                   [Tok(tag='NN*'), Tok(tag='NN*'), Tok(words=NOMINALIZED_ACTIONS, tag='NN*')], gerund_before_compound,
+                   triggers=NOMINALIZED_ACTIONS),
+    TokenRule("CleanFillersNLTK", clean_fillers_nltk, triggers=FILLER_STARTERS),
+    RegexRule("FixEditingVerbConstruction", [(r'plans (for|on) the editing', 'plans to edit')]),
+    TokenRule("FixVerbAgreementNLTK", fix_subject_verb_agreement_nltk, triggers=SINGULAR_SUBJECTS),
+    TagPatternRule("DisambiguateNominalVerbNounNLTK",
+                   [Tok(words=AMBIGUOUS_ROOTS, tag='NN'), Tok(tag='NN')], gerund_before_noun,
+                   triggers=AMBIGUOUS_ROOTS),
 ]
 
 pipeline = ReconstructionPipeline(rules)
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rule-based sentence reconstruction")
+    parser.add_argument("input", nargs="?", help="file with one sentence per line (default: built-in examples)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--chunksize", type=int, default=512)
+    parser.add_argument("--offline", action="store_true", help="fail instead of downloading missing NLTK data")
+    parser.add_argument("--stats", metavar="PATH", help="time each rule and write a JSON summary to PATH")
+    parser.add_argument("--fixpoint", action="store_true", help="re-apply rules touched by edits until nothing changes")
+    parser.add_argument("--max-passes", type=int, default=3)
+    parser.add_argument("--cache", metavar="PATH", help="SQLite file for reconstructions shared across runs")
+    parser.add_argument("--cache-size", type=int, default=100_000, help="in-memory LRU entries")
+    parser.add_argument("--order-from", metavar="PATH",
+                        help="reorder rules (rarely firing, cheap first) from a --stats JSON of an earlier run")
+    parser.add_argument("--check-import-time", action="store_true",
+                        help=f"measure the module import time against its {IMPORT_TIME_BUDGET}s budget and exit")
+    args = parser.parse_args()
+
+    if args.check_import_time:
+        seconds = measure_import_time()
+        print(f"Import time: {seconds * 1000:.1f} ms (budget {IMPORT_TIME_BUDGET * 1000:.0f} ms)")
+        sys.exit(0 if seconds <= IMPORT_TIME_BUDGET else 1)
+    if args.offline:
+        pipeline.offline = True
+    if args.stats:
+        pipeline.instrument()
+    pipeline.fixpoint = args.fixpoint
+    if args.cache:
+        pipeline.cache = ReconstructionCache(args.cache_size, args.cache)
+    pipeline.max_passes = args.max_passes
+    if args.order_from:
+        with open(args.order_from, encoding="utf-8") as f:
+            print("Rule order:", pipeline.reorder_rules(json.load(f)))
+
     sentences = [
         "Hope you too, to enjoy it as my deepest wishes.",
         "Also, kindly remind me please, if the doctor still plan for the acknowledgments section edit before he sending again.",
@@ -407,10 +1141,22 @@ if __name__ == "__main__":
         "We might can go tomorrow if the document gets finalized approved.",
     ]
 
+    if args.input:
+        with open(args.input, encoding="utf-8") as f:
+            sentences = [line.strip() for line in f if line.strip()]
+
     print("\n === Sentence Reconstruction === \n")
-    for i, s in enumerate(sentences):
-        output, applied = pipeline.reconstruct(s)
+    results = pipeline.reconstruct_many(sentences, workers=args.workers, chunksize=args.chunksize)
+    for i, (s, (output, applied)) in enumerate(zip(sentences, results)):
         print(f"Original {i+1}: {s}")
         print(f"Reconstructed {i+1}: {output}")
         print(f"Rules Applied: {applied}")
         print()
+
+    if args.stats:
+        pipeline.dump_stats(args.stats)
+        print(f"Rule stats saved to: {os.path.abspath(args.stats)}")
+
+    if pipeline.cache is not None:
+        pipeline.cache.close()
+        print("Cache:", pipeline.cache.info())
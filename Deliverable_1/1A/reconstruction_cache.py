@@ -0,0 +1,115 @@
+# reconstruction_cache.py
+
+"""
+Memoization cache for Deliverable 1A reconstructions
+- In-memory LRU with a size bound
+- Optional SQLite store shared across runs and processes
+"""
+
+import json
+from collections import Counter, OrderedDict
+
+
+def normalize_sentence(sentence):
+    """Cache key form of a sentence: surrounding and repeated whitespace collapsed."""
+    return ' '.join(sentence.split())
+
+
+class ReconstructionCache:
+    """
+    Maps `(fingerprint, normalised sentence)` to `(output, applied_rules)`.
+
+    The fingerprint identifies the rule set that produced an entry, so
+    entries made by other rule versions are simply never looked up. `counts`
+    tracks `hits` (memory), `disk_hits` and `misses`.
+    """
+
+    def __init__(self, maxsize=100_000, path=None):
+        self.maxsize = maxsize
+        self.path = path
+        self.counts = Counter()
+        self._memory = OrderedDict()
+        self._db = None
+        self._pending = 0
+
+    def __getstate__(self):
+        # Worker processes get an empty LRU and open their own connection
+        return {"maxsize": self.maxsize, "path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _connection(self):
+        if self._db is None:
+            import sqlite3
+
+            self._db = sqlite3.connect(self.path, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS reconstructions ("
+                "fingerprint TEXT, sentence TEXT, output TEXT, applied TEXT, "
+                "PRIMARY KEY (fingerprint, sentence))"
+            )
+            self._db.commit()
+        return self._db
+
+    def get(self, fingerprint, sentence):
+        key = (fingerprint, sentence)
+        value = self._memory.get(key)
+        if value is not None:
+            self._memory.move_to_end(key)
+            self.counts["hits"] += 1
+            return value[0], list(value[1])
+        if self.path is not None:
+            row = self._connection().execute(
+                "SELECT output, applied FROM reconstructions WHERE fingerprint = ? AND sentence = ?",
+                key,
+            ).fetchone()
+            if row is not None:
+                self.counts["disk_hits"] += 1
+                self._remember(key, (row[0], tuple(json.loads(row[1]))))
+                return row[0], json.loads(row[1])
+        self.counts["misses"] += 1
+        return None
+
+    def put(self, fingerprint, sentence, output, applied_rules):
+        key = (fingerprint, sentence)
+        self._remember(key, (output, tuple(applied_rules)))
+        if self.path is not None:
+            self._connection().execute(
+                "INSERT OR IGNORE INTO reconstructions VALUES (?, ?, ?, ?)",
+                (fingerprint, sentence, output, json.dumps(applied_rules)),
+            )
+            self._pending += 1
+            if self._pending >= 1000:
+                self.flush()
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def flush(self):
+        """Commit pending disk writes (done after every batch)."""
+        if self._pending:
+            self._db.commit()
+            self._pending = 0
+
+    def close(self):
+        self.flush()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def info(self):
+        lookups = sum(self.counts.values())
+        hits = self.counts["hits"] + self.counts["disk_hits"]
+        return {
+            "hits": self.counts["hits"],
+            "disk_hits": self.counts["disk_hits"],
+            "misses": self.counts["misses"],
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "size": len(self._memory),
+            "maxsize": self.maxsize,
+        }
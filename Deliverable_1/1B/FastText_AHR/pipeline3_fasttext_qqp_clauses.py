@@ -1,41 +1,68 @@
+import argparse
 import os
+import sys
 import nltk
 import numpy as np
 import re
 from nltk.tokenize import sent_tokenize
-from datasets import load_dataset
-from gensim.downloader import load as gensim_load
-from scipy.spatial.distance import cosine
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils.candidate_sources import load_qqp_candidates
+from utils.constrained_search import ConstrainedRetriever
+from utils.retrieval import add_retrieval_arguments, build_backend
+from utils.word_vectors import load_vectors
+
+parser = argparse.ArgumentParser(description="FastText + QQP clause-level reconstruction")
+parser.add_argument("--num-proc", type=int, default=None, help="processes for dataset filtering")
+parser.add_argument("--vectors-vocab", type=int, default=None,
+                    help="keep only the N most frequent FastText words plus the words of the candidates and input texts")
+parser.add_argument("--vectors-float16", action="store_true", help="store and map the FastText vectors as float16")
+add_retrieval_arguments(parser)
+args = parser.parse_args()
+
+VECTORS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "index", "vectors")
 
 nltk.download("punkt")
 
-# Load FastText embeddings
-print("Loading FastText vectors...")
-fasttext_model = gensim_load("fasttext-wiki-news-subwords-300")
+# Input texts
+text1 = """Today is our dragon boat festival, in our Chinese culture, to celebrate it with all safe and great in 
+our lives. Hope you too, to enjoy it as my deepest wishes. 
+Thank your message to show our words to  the doctor, as his next contract checking, to all of us. 
+I got this message to see the approved message. In fact, I have received the message from  the 
+professor, to show me, this, a couple of days ago.  I am very appreciated  the full support of the 
+professor, for our Springer proceedings publication"""
 
-# Load QQP dataset
+text2 = """During our final discuss, I told him about the new submission — the one we were waiting since 
+last autumn, but the updates was confusing as it not included the full feedback from reviewer or 
+maybe editor?
+Anyway, I believe the team, although bit delay and less communication at recent days, they really 
+tried best for paper and cooperation. We should be grateful, I mean all of us, for the acceptance 
+and efforts until the Springer link came finally last week, I think.
+Also, kindly remind me please, if the doctor still plan for the acknowledgments section edit before 
+he sending again. Because I didn’t see that part final yet, or maybe I missed, I apologize if so.
+Overall, let us make sure all are safe and celebrate the outcome with strong coffee and future 
+targets"""
+
+# Clause splitter
+def split_clauses(sentence):
+    return re.split(r"(?<=\w)[,;]\s+|\s+(?<!not)and\s+|\s+but\s+|\s+or\s+", sentence)
+
+# Load QQP and keep the formal second questions of duplicate pairs
 print("Loading QQP dataset...")
-qqp = load_dataset("quora", split="train[:5000]", trust_remote_code=True)
-print(f"✓ Loaded {len(qqp)} samples from QQP dataset.")
-
-# Filter for formal paraphrase candidates
-def is_formal(sentence):
-    return (
-        sentence is not None and
-        len(sentence.split()) > 6 and
-        "'" not in sentence and
-        "?" not in sentence and
-        " gonna " not in sentence and
-        " wanna " not in sentence
-    )
-
-paraphrase_candidates = [
-    ex["questions"]["text"][1]
-    for ex in qqp
-    if ex["is_duplicate"] and is_formal(ex["questions"]["text"][1])
-]
+paraphrase_candidates = load_qqp_candidates("train[:5000]", num_proc=args.num_proc)
 print(f"✓ Retained {len(paraphrase_candidates)} formal candidates.")
 
+# Load FastText embeddings (memory-mapped native copy; a restricted one keeps every
+# word of the candidates and of the input clauses, so no embedding changes)
+print("Loading FastText vectors...")
+used_words = set()
+if args.vectors_vocab:
+    used_words = {w for s in paraphrase_candidates for w in s.lower().split()}
+    used_words |= {w for text in (text1, text2) for sent in sent_tokenize(text)
+                   for clause in split_clauses(sent) for w in clause.strip().lower().split()}
+fasttext_model = load_vectors("fasttext-wiki-news-subwords-300", VECTORS_DIR, args.vectors_vocab, used_words,
+                              dtype="float16" if args.vectors_float16 else "float32")
+
 # Compute FastText average embeddings
 def sentence_embedding(text):
     words = [w for w in text.lower().split() if w in fasttext_model]
@@ -44,11 +71,10 @@ def sentence_embedding(text):
     return np.mean([fasttext_model[w] for w in words], axis=0)
 
 print("Embedding candidate sentences...")
-candidate_embeddings = [sentence_embedding(s) for s in paraphrase_candidates]
-
-# Clause splitter
-def split_clauses(sentence):
-    return re.split(r"(?<=\w)[,;]\s+|\s+(?<!not)and\s+|\s+but\s+|\s+or\s+", sentence)
+candidate_embeddings = np.array([sentence_embedding(s) for s in paraphrase_candidates], dtype=np.float32)
+searcher = build_backend(args, candidate_embeddings)
+# Length ratio 0.7-1.3 and at least 2 shared tokens, checked over the top-k hits
+retriever = ConstrainedRetriever(searcher, paraphrase_candidates, 0.7, 1.3, 2, top_k=args.top_k)
 
 # Reconstruction function
 def fasttext_reconstruct(text, threshold=0.75):
@@ -69,20 +95,9 @@ def fasttext_reconstruct(text, threshold=0.75):
                 new_clauses.append(clause)
                 continue
 
-            sims = [1 - cosine(emb, c) for c in candidate_embeddings]
-            best_idx = int(np.argmax(sims))
-            best_score = sims[best_idx]
-            best_candidate = paraphrase_candidates[best_idx]
-
-            length_ratio = len(best_candidate.split()) / max(1, len(clause.split()))
-            shared_tokens = len(set(clause.lower().split()) & set(best_candidate.lower().split()))
-
-            if (
-                best_score > threshold and
-                0.7 <= length_ratio <= 1.3 and
-                shared_tokens >= 2
-            ):
-                new_clauses.append(best_candidate)
+            best = retriever.best_hits([clause], emb[None, :], threshold)[0]
+            if best:
+                new_clauses.append(paraphrase_candidates[best["corpus_id"]])
             else:
                 new_clauses.append(clause)
 
@@ -90,25 +105,6 @@ def fasttext_reconstruct(text, threshold=0.75):
 
     return " ".join(reconstructed)
 
-# Input texts
-text1 = """Today is our dragon boat festival, in our Chinese culture, to celebrate it with all safe and great in 
-our lives. Hope you too, to enjoy it as my deepest wishes. 
-Thank your message to show our words to  the doctor, as his next contract checking, to all of us. 
-I got this message to see the approved message. In fact, I have received the message from  the 
-professor, to show me, this, a couple of days ago.  I am very appreciated  the full support of the 
-professor, for our Springer proceedings publication"""
-
-text2 = """During our final discuss, I told him about the new submission — the one we were waiting since 
-last autumn, but the updates was confusing as it not included the full feedback from reviewer or 
-maybe editor?
-Anyway, I believe the team, although bit delay and less communication at recent days, they really 
-tried best for paper and cooperation. We should be grateful, I mean all of us, for the acceptance 
-and efforts until the Springer link came finally last week, I think.
-Also, kindly remind me please, if the doctor still plan for the acknowledgments section edit before 
-he sending again. Because I didn’t see that part final yet, or maybe I missed, I apologize if so.
-Overall, let us make sure all are safe and celebrate the outcome with strong coffee and future 
-targets"""
-
 # Run reconstruction
 print("Reconstructing with clause-level FastText...")
 reconstructed1 = fasttext_reconstruct(text1)
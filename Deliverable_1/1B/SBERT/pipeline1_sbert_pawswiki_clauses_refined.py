@@ -1,37 +1,32 @@
+import argparse
 import os
+import sys
 import nltk
 import re
 from nltk.tokenize import sent_tokenize
-from datasets import load_dataset
-from sentence_transformers import SentenceTransformer, util
-
-nltk.download("punkt")
-
-# Load SBERT model
-model = SentenceTransformer("paraphrase-MiniLM-L6-v2")
-
-# Load PAWS-Wiki dataset
-print("Loading PAWS-Wiki dataset...")
-paws = load_dataset("paws", "labeled_final", split="train")
-
-# Formality filter
-def is_formal(sentence):
-    return (
-        sentence is not None and
-        len(sentence.split()) > 6 and
-        "'" not in sentence and
-        "?" not in sentence and
-        " gonna " not in sentence and
-        " wanna " not in sentence
-    )
-
-# Extract sentence2 from positive (duplicate) pairs
-paraphrase_candidates = [ex["sentence2"] for ex in paws if ex["label"] == 1 and is_formal(ex["sentence2"])]
-print(f"✓ Retained {len(paraphrase_candidates)} formal paraphrase candidates.")
-
-# Encode with SBERT
-print("Encoding candidates...")
-paraphrase_embeddings = model.encode(paraphrase_candidates, convert_to_tensor=True)
+from sentence_transformers import SentenceTransformer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils.batching import benchmark_encoding
+from utils.candidate_sources import SOURCES
+from utils.constrained_search import ConstrainedRetriever
+from utils.embedding_cache import EmbeddingCache
+from utils.retrieval import add_retrieval_arguments, build_backend
+from utils.sharded_index import ShardedIndex
+
+parser = argparse.ArgumentParser(description="SBERT + PAWS-Wiki clause-level reconstruction")
+parser.add_argument("--sources", nargs="+", choices=sorted(SOURCES), default=["pawswiki"],
+                    help="paraphrase sources indexed as shards (default: pawswiki)")
+parser.add_argument("--search-sources", nargs="+", choices=sorted(SOURCES), default=None,
+                    help="only search these of the indexed sources")
+parser.add_argument("--rebuild-index", action="store_true", help="re-encode the candidate index")
+parser.add_argument("--encode-workers", type=int, default=1,
+                    help="processes encoding candidates when building the index")
+parser.add_argument("--benchmark-encoding", action="store_true",
+                    help="report tokens/s of plain vs token-budget batched encoding on the candidates")
+parser.add_argument("--query-cache", default=None, help="SQLite file persisting clause embeddings")
+parser.add_argument("--num-proc", type=int, default=None, help="processes for dataset filtering")
+add_retrieval_arguments(parser)
 
 # Input texts
 text1 = """Today is our dragon boat festival, in our Chinese culture, to celebrate it with all safe and great in 
@@ -56,50 +51,88 @@ targets"""
 def split_clauses(sentence):
     return re.split(r"(?<=\w)[,;]\s+|\s+(?<!not)and\s+|\s+but\s+|\s+or\s+", sentence)
 
-# SBERT clause-wise reconstruction
-def sbert_reconstruct(text, threshold=0.6):
-    sentences = sent_tokenize(text)
-    reconstructed = []
-
-    for sent in sentences:
-        clauses = split_clauses(sent)
-        new_clauses = []
-
-        for clause in clauses:
-            if not clause.strip():
-                continue
-
-            query_embedding = model.encode(clause.strip(), convert_to_tensor=True)
-            hits = util.semantic_search(query_embedding, paraphrase_embeddings, top_k=1)
-            best = hits[0][0]
-            score = best["score"]
-            idx = best["corpus_id"]
-
-            candidate = paraphrase_candidates[idx]
-            length_ratio = len(candidate.split()) / max(1, len(clause.split()))
-            shared_tokens = len(set(clause.lower().split()) & set(candidate.lower().split()))
-
-            if score > threshold and 0.6 <= length_ratio <= 1.4 and shared_tokens >= 1:
-                new_clauses.append(candidate)
-            else:
-                new_clauses.append(clause.strip())
-
-        reconstructed.append(", ".join(new_clauses))
-
-    return " ".join(reconstructed)
-
-# Run reconstruction
-print("Reconstructing...")
-reconstructed1 = sbert_reconstruct(text1)
-reconstructed2 = sbert_reconstruct(text2)
-
-# Save output
-output_path = "reconstructed_texts_pipeline1_sbert_pawswiki_clauses_refined.txt"
-with open(output_path, "w", encoding="utf-8") as f:
-    f.write("Reconstructed Text 1:\n")
-    f.write(reconstructed1 + "\n\n")
-    f.write("Reconstructed Text 2:\n")
-    f.write(reconstructed2 + "\n")
-
-print("✅ SBERT + PAWS-Wiki (refined clauses) pipeline complete. Output saved to:")
-print(os.path.abspath(output_path))
+# Spawned worker processes re-import this script, so only the main process runs it
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    nltk.download("punkt")
+
+    # Load SBERT model
+    MODEL_NAME = "paraphrase-MiniLM-L6-v2"
+    model = SentenceTransformer(MODEL_NAME)
+
+    # Candidate index shards, one per source (each rebuilt only when model, dataset or filters change)
+    INDEX_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "index")
+
+    def make_searcher(embeddings, directory, key):
+        return build_backend(args, embeddings, normalized=True, directory=directory, key=key)
+
+    # Load the encoded candidates of every source, building missing shards
+    index = ShardedIndex.load_or_build(INDEX_ROOT, model, MODEL_NAME, args.sources, make_searcher,
+                                       num_proc=args.num_proc, rebuild=args.rebuild_index,
+                                       workers=args.encode_workers)
+    paraphrase_candidates = index.texts
+    searcher = index.only(args.search_sources) if args.search_sources else index
+
+    if args.benchmark_encoding:
+        report = benchmark_encoding(model, paraphrase_candidates[:2000])
+        print(f"Encoding {report['texts']} candidates ({report['tokens']} tokens): "
+              f"{report['plain_tokens_per_s']:.0f} tokens/s plain, "
+              f"{report['bucketed_tokens_per_s']:.0f} tokens/s length-bucketed "
+              f"(padding {report['padding_ratio']:.2f}x)")
+    # Clause embeddings are cached across texts (and runs, with --query-cache)
+    query_cache = EmbeddingCache(path=args.query_cache)
+
+    # Length ratio 0.6-1.4 and at least 1 shared token, checked over the top-k hits
+    retriever = ConstrainedRetriever(searcher, paraphrase_candidates, 0.6, 1.4, 1, top_k=args.top_k)
+
+    # SBERT clause-wise reconstruction
+    def sbert_reconstruct_many(texts, threshold=0.6):
+        """Reconstruct several texts with one batched encode and one search over all their clauses."""
+        documents = []
+        queries = []
+        for text in texts:
+            sentences = []
+            for sent in sent_tokenize(text):
+                clauses = [clause.strip() for clause in split_clauses(sent) if clause.strip()]
+                sentences.append(clauses)
+                queries.extend(clauses)
+            documents.append(sentences)
+
+        hits = []
+        if queries:
+            query_embeddings = query_cache.encode(model, MODEL_NAME, queries)
+            hits = retriever.best_hits(queries, query_embeddings, threshold)
+        best_hits = iter(hits)
+
+        results = []
+        for sentences in documents:
+            reconstructed = []
+            for clauses in sentences:
+                new_clauses = []
+                for clause in clauses:
+                    best = next(best_hits)
+                    new_clauses.append(paraphrase_candidates[best["corpus_id"]] if best else clause)
+                reconstructed.append(", ".join(new_clauses))
+            results.append(" ".join(reconstructed))
+        return results
+
+    def sbert_reconstruct(text, threshold=0.6):
+        return sbert_reconstruct_many([text], threshold)[0]
+
+    # Run reconstruction
+    print("Reconstructing...")
+    reconstructed1, reconstructed2 = sbert_reconstruct_many([text1, text2])
+    query_cache.close()
+    print(f"Query cache: {query_cache.info()}")
+
+    # Save output
+    output_path = "reconstructed_texts_pipeline1_sbert_pawswiki_clauses_refined.txt"
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write("Reconstructed Text 1:\n")
+        f.write(reconstructed1 + "\n\n")
+        f.write("Reconstructed Text 2:\n")
+        f.write(reconstructed2 + "\n")
+
+    print("✅ SBERT + PAWS-Wiki (refined clauses) pipeline complete. Output saved to:")
+    print(os.path.abspath(output_path))
@@ -1,15 +1,24 @@
 import os
+import sys
 import spacy
 import nltk
 from nltk.tokenize import sent_tokenize
 from gensim.downloader import load as gensim_load
-from scipy.spatial.distance import cosine
-import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from utils.lexical_neighbours import NeighbourEngine
+from utils.pos_lexicon import PosOracle, load_or_build_pos_lexicon
+
+POS_LEXICON = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "index", "glove_pos.json")
 
 nltk.download("punkt")
 
 nlp = spacy.load("en_core_web_lg")
 glove = gensim_load("glove-wiki-gigaword-300")
+neighbours = NeighbourEngine(glove, top_n=10000)
+pos_tags = load_or_build_pos_lexicon(POS_LEXICON, nlp, neighbours.words)
+neighbours.set_pos(pos_tags)
+lemma_pos = PosOracle(nlp, dict(zip(neighbours.words, pos_tags)))
 
 # Input texts
 text1 = """Today is our dragon boat festival, in our Chinese culture, to celebrate it with all safe and great in 
@@ -34,35 +43,10 @@ ALLOWED_NOUN_DEPS = {"nsubj", "dobj", "pobj", "attr"}
 ALLOWED_VERB_DEPS = {"ROOT", "xcomp", "ccomp", "conj"}
 
 def looks_like_verb_noun(token):
-    if token.pos_ == "NOUN" and token.dep_ in ALLOWED_NOUN_DEPS:
-        try:
-            guess = nlp(token.lemma_)[0]
-            return guess.pos_ == "VERB"
-        except Exception:
-            return False
-    return False
+    return token.pos_ == "NOUN" and token.dep_ in ALLOWED_NOUN_DEPS and lemma_pos(token.lemma_) == "VERB"
 
 def find_glove_alternative(word, target_pos):
-    if word not in glove:
-        return None
-    word_vec = glove[word]
-    best_word = None
-    best_score = -1
-    for cand in glove.index_to_key[:10000]:
-        if cand == word:
-            continue
-        if abs(len(cand) - len(word)) > 5:
-            continue
-        sim = 1 - cosine(word_vec, glove[cand])
-        if sim > best_score:
-            try:
-                cand_pos = nlp(cand)[0].pos_
-                if cand_pos == target_pos:
-                    best_score = sim
-                    best_word = cand
-            except:
-                continue
-    return best_word if best_score > 0.7 else None
+    return neighbours.best(word, threshold=0.7, pos=target_pos, max_length_diff=5)
 
 def spacy_rule_based_glove_reconstruct(text):
     sentences = sent_tokenize(text)
@@ -71,6 +55,7 @@ def spacy_rule_based_glove_reconstruct(text):
 
     for idx, sent in enumerate(sentences):
         doc = nlp(sent)
+        lemma_pos.prefetch(token.lemma_ for token in doc if token.pos_ == "NOUN" and token.dep_ in ALLOWED_NOUN_DEPS)
         modified = sent
         changed = False
 
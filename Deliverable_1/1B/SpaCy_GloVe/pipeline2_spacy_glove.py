@@ -1,15 +1,31 @@
+import argparse
 import os
+import sys
 import spacy
 import nltk
 from nltk.tokenize import sent_tokenize
-from gensim.downloader import load as gensim_load
-from scipy.spatial.distance import cosine
-import numpy as np
 
-nltk.download("punkt")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils.lexical_neighbours import NeighbourEngine, load_or_build_table
+from utils.pos_lexicon import PosOracle, load_or_build_pos_lexicon
+from utils.word_vectors import load_vectors
 
-nlp = spacy.load("en_core_web_lg")
-glove = gensim_load("glove-wiki-gigaword-300")
+parser = argparse.ArgumentParser(description="SpaCy + GloVe rule-based reconstruction")
+parser.add_argument("--table-words", type=int, default=50_000,
+                    help="most frequent GloVe words with precomputed neighbours (0 = live search only)")
+parser.add_argument("--table-k", type=int, default=10, help="neighbours stored per word")
+parser.add_argument("--rebuild-table", action="store_true", help="recompute the neighbour table")
+parser.add_argument("--workers", type=int, default=None, help="processes building the table (default: all cores)")
+parser.add_argument("--vectors-vocab", type=int, default=None,
+                    help="keep only the N most frequent GloVe words (at least the candidate vocabulary) "
+                         "plus the words and lemmas of the input texts")
+parser.add_argument("--vectors-float16", action="store_true", help="store and map the GloVe vectors as float16")
+
+GLOVE_MODEL = "glove-wiki-gigaword-300"
+CANDIDATE_WORDS = 10000
+VECTORS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "index", "vectors")
+TABLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "index", "glove_neighbours")
+POS_LEXICON = os.path.join(os.path.dirname(os.path.abspath(__file__)), "index", "glove_pos.json")
 
 # Input texts
 text1 = """Today is our dragon boat festival, in our Chinese culture, to celebrate it with all safe and great in 
@@ -30,76 +46,83 @@ he sending again. Because I didn’t see that part final yet, or maybe I missed,
 Overall, let us make sure all are safe and celebrate the outcome with strong coffee and future 
 targets"""
 
-def looks_like_verb_noun(token):
-    if token.pos_ == "NOUN":
-        try:
-            guess = nlp(token.lemma_)[0]
-            if guess.pos_ == "VERB":
-                return True
-        except Exception:
-            return False
-    return False
-
-def find_glove_alternative(word):
-    if word not in glove:
-        return None
-    word_vec = glove[word]
-    best_word = None
-    best_score = -1
-    for cand in glove.index_to_key[:10000]:
-        if cand == word:
-            continue
-        sim = 1 - cosine(word_vec, glove[cand])
-        if sim > best_score:
-            best_score = sim
-            best_word = cand
-    return best_word if best_score > 0.7 else None
-
-def spacy_rule_based_glove_reconstruct(text):
-    sentences = sent_tokenize(text)
-    reconstructed = []
-    log = []
-
-    for idx, sent in enumerate(sentences):
-        doc = nlp(sent)
-        modified = sent
-        changed = False
-
-        # Rule 1: Noun used where verb may be more appropriate
-        for token in doc:
-            if looks_like_verb_noun(token):
-                alt = find_glove_alternative(token.text.lower())
-                if alt and alt != token.text.lower():
-                    modified = modified.replace(token.text, alt)
-                    changed = True
-
-        # Rule 2: Passive structure with any past participle verb
-        for token in doc:
-            if token.pos_ == "AUX" and token.lemma_ == "be":
-                for child in token.head.subtree:
-                    if child.tag_ == "VBN" and child.pos_ == "VERB" and child.dep_ != "auxpass":
-                        alt = find_glove_alternative(child.lemma_)
-                        if alt and alt != child.lemma_:
-                            changed = True
-
-        if changed:
-            reconstructed.append(modified)
-        else:
-            reconstructed.append(sent)
-
-    return " ".join(reconstructed), log
-
-# Process both texts
-reconstructed1, log1 = spacy_rule_based_glove_reconstruct(text1)
-reconstructed2, log2 = spacy_rule_based_glove_reconstruct(text2)
-
-# Save output
-output_path = "reconstructed_texts_pipeline2_spacy_glove.txt"
-with open(output_path, "w", encoding="utf-8") as f:
-    f.write("Reconstructed Text 1:\n")
-    f.write(reconstructed1 + "\n\n")
-    f.write("Reconstructed Text 2:\n")
-    f.write(reconstructed2 + "\n\n")
-
-print("✅ SpaCy + GloVe rule-based repair with similarity-based replacements complete. Output saved to:")
-print(os.path.abspath(output_path))
+# Spawned table workers re-import this script, so only the main process runs it
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    nltk.download("punkt")
+
+    nlp = spacy.load("en_core_web_lg")
+    # A restricted vocabulary keeps every word the rules may look up: the lowercased
+    # tokens and lemmas of the input sentences, parsed as the reconstruction parses them
+    input_words = set()
+    vocab_size = None
+    if args.vectors_vocab:
+        vocab_size = max(args.vectors_vocab, CANDIDATE_WORDS)
+        input_words = {word for text in (text1, text2) for sent in sent_tokenize(text) for token in nlp(sent)
+                       for word in (token.text.lower(), token.lemma_)}
+    glove = load_vectors(GLOVE_MODEL, VECTORS_DIR, vocab_size, input_words,
+                         dtype="float16" if args.vectors_float16 else "float32")
+    engine = NeighbourEngine(glove, top_n=CANDIDATE_WORDS)
+    neighbours = engine
+    if args.table_words:
+        neighbours = load_or_build_table(TABLE_DIR, engine, GLOVE_MODEL, rows=args.table_words,
+                                         k=args.table_k, rebuild=args.rebuild_table, workers=args.workers)
+    lemma_pos = PosOracle(nlp, dict(zip(engine.words, load_or_build_pos_lexicon(POS_LEXICON, nlp, engine.words))))
+
+    def looks_like_verb_noun(token):
+        return token.pos_ == "NOUN" and lemma_pos(token.lemma_) == "VERB"
+
+    def find_glove_alternative(word):
+        return neighbours.best(word, threshold=0.7)
+
+    def spacy_rule_based_glove_reconstruct(text):
+        sentences = sent_tokenize(text)
+        reconstructed = []
+        log = []
+
+        for idx, sent in enumerate(sentences):
+            doc = nlp(sent)
+            lemma_pos.prefetch(token.lemma_ for token in doc if token.pos_ == "NOUN")
+            modified = sent
+            changed = False
+
+            # Rule 1: Noun used where verb may be more appropriate
+            for token in doc:
+                if looks_like_verb_noun(token):
+                    alt = find_glove_alternative(token.text.lower())
+                    if alt and alt != token.text.lower():
+                        modified = modified.replace(token.text, alt)
+                        changed = True
+
+            # Rule 2: Passive structure with any past participle verb
+            for token in doc:
+                if token.pos_ == "AUX" and token.lemma_ == "be":
+                    for child in token.head.subtree:
+                        if child.tag_ == "VBN" and child.pos_ == "VERB" and child.dep_ != "auxpass":
+                            alt = find_glove_alternative(child.lemma_)
+                            if alt and alt != child.lemma_:
+                                changed = True
+
+            if changed:
+                reconstructed.append(modified)
+            else:
+                reconstructed.append(sent)
+
+        return " ".join(reconstructed), log
+
+    # Process both texts
+    reconstructed1, log1 = spacy_rule_based_glove_reconstruct(text1)
+    reconstructed2, log2 = spacy_rule_based_glove_reconstruct(text2)
+
+    # Save output
+    output_path = "reconstructed_texts_pipeline2_spacy_glove.txt"
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write("Reconstructed Text 1:\n")
+        f.write(reconstructed1 + "\n\n")
+        f.write("Reconstructed Text 2:\n")
+        f.write(reconstructed2 + "\n\n")
+
+    print("✅ SpaCy + GloVe rule-based repair with similarity-based replacements complete. Output saved to:")
+    print(os.path.abspath(output_path))
+    print("Lemma POS oracle:", lemma_pos.info())
@@ -0,0 +1,188 @@
+# 1B/utils/candidate_index.py
+
+"""
+Candidate Index Module
+- Builds the filtered paraphrase candidates and their normalised embeddings once
+- Encodes in a pool of worker processes, streaming chunks to disk; interrupted builds resume
+- Stores them as float32 .npy + candidate texts + manifest
+- Later runs memory-map the index and rebuild only when the manifest changes
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import time
+from collections import Counter
+
+import numpy as np
+
+from utils.batching import DEFAULT_MAX_TOKENS, encode_batched
+from utils.resumable_build import MANIFEST_FILE, ResumableBuild, discard_progress, map_chunks
+
+EMBEDDINGS_FILE = "embeddings.npy"
+TEXTS_FILE = "candidates.json"
+INDEX_VERSION = 1
+
+
+class CandidateIndex:
+    """
+    Candidate texts with their L2-normalised embeddings (row i embeds texts[i]).
+    `embeddings` is a memory-mapped float32 array when loaded from disk.
+    """
+
+    def __init__(self, texts, embeddings, manifest):
+        self.texts = texts
+        self.embeddings = embeddings
+        self.manifest = manifest
+
+    def __len__(self):
+        return len(self.texts)
+
+
+def index_manifest(model_name, dataset, *filters):
+    """
+    Manifest fields that decide whether a stored index can be reused: the
+    encoder, the dataset description and the source of the functions that
+    select the candidates (so editing a filter triggers a rebuild).
+    """
+    digest = hashlib.sha256()
+    for func in filters:
+        digest.update(inspect.getsource(func).encode())
+    return {
+        "version": INDEX_VERSION,
+        "model": model_name,
+        "dataset": dataset,
+        "filter": digest.hexdigest(),
+    }
+
+
+def _checksum(*paths):
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def build_index(directory, model, manifest, texts, max_tokens=DEFAULT_MAX_TOKENS, workers=1,
+                threads=None, chunk_size=4096):
+    """
+    Encode `texts` and write the index to `directory`; the manifest is written last.
+
+    Texts are encoded in chunks of `chunk_size`, by `workers` spawned processes
+    (each loading the SentenceTransformer named in `manifest["model"]`, limited
+    to `threads` torch threads) or else by `model` itself, in
+    token-budget batches of at most `max_tokens` padded tokens, and every
+    chunk is written into embeddings.npy in order as soon as it arrives. An
+    interrupted build resumes after the last written chunk when called again
+    with the same manifest and texts (see ResumableBuild).
+    """
+    embeddings_path = os.path.join(directory, EMBEDDINGS_FILE)
+    texts_path = os.path.join(directory, TEXTS_FILE)
+    texts_digest = hashlib.sha256(json.dumps(texts, ensure_ascii=False).encode()).hexdigest()
+    dim = model.get_sentence_embedding_dimension()
+    build = ResumableBuild(directory, {"manifest": manifest, "texts": texts_digest},
+                           {EMBEDDINGS_FILE: (np.float32, (len(texts), dim))}, chunk_size)
+    if not build.resumed:
+        with open(texts_path, "w", encoding="utf-8") as f:
+            json.dump(texts, f, ensure_ascii=False)
+
+    pending = build.pending()
+    threads = threads or max(1, (os.cpu_count() or 1) // max(1, workers))
+    # Workers load the model by name; this process encodes with the one already loaded
+    encoded = map_chunks(_encode_chunk, [texts[start:end] for start, end in pending], workers,
+                         _init_encoder, (manifest["model"], threads, max_tokens),
+                         local=lambda chunk: _encode(model, max_tokens, chunk))
+    tokens = 0
+    start_time = time.perf_counter()
+    for (start, end), (chunk, chunk_tokens) in zip(pending, encoded):
+        build.write(start, chunk)
+        tokens += chunk_tokens
+        print(f"  encoded {end}/{len(texts)} candidates")
+    elapsed = time.perf_counter() - start_time
+    if tokens:
+        print(f"  {tokens} tokens encoded at {tokens / elapsed:.0f} tokens/s")
+
+    manifest = dict(
+        manifest,
+        count=len(texts),
+        dim=dim,
+        dtype="float32",
+        checksum=_checksum(embeddings_path, texts_path),
+    )
+    build.finish(manifest)
+    return load_index(directory, manifest)
+
+
+# === Encoding Workers ===
+# Set up once per worker process by the pool initializer
+
+_encoder = None
+
+
+def _init_encoder(model_name, threads, max_tokens):
+    global _encoder
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(threads)
+    _encoder = (SentenceTransformer(model_name), max_tokens)
+
+
+def _encode_chunk(texts):
+    return _encode(*_encoder, texts)
+
+
+def _encode(model, max_tokens, texts):
+    stats = Counter()
+    embeddings = encode_batched(model, texts, max_tokens, stats, normalize_embeddings=True)
+    return embeddings.astype(np.float32), stats["tokens"]
+
+
+def load_index(directory, manifest, verify=False, mmap_mode="c"):
+    """
+    Memory-map the index in `directory` if its manifest matches `manifest`,
+    else return None. `verify=True` also re-checks the stored checksum.
+    The default copy-on-write mapping shares pages between processes and
+    can be wrapped by torch without a read-only warning.
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE), encoding="utf-8") as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if any(stored.get(key) != value for key, value in manifest.items()):
+        return None
+
+    embeddings_path = os.path.join(directory, EMBEDDINGS_FILE)
+    texts_path = os.path.join(directory, TEXTS_FILE)
+    if verify and _checksum(embeddings_path, texts_path) != stored["checksum"]:
+        return None
+    try:
+        embeddings = np.load(embeddings_path, mmap_mode=mmap_mode)
+        with open(texts_path, encoding="utf-8") as f:
+            texts = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if len(texts) != stored["count"] or embeddings.shape != (stored["count"], stored["dim"]):
+        return None
+    return CandidateIndex(texts, embeddings, stored)
+
+
+def load_or_build_index(directory, model, manifest, load_candidates, rebuild=False, workers=1):
+    """
+    Return the stored index for `manifest`, building it first (from the texts
+    returned by `load_candidates()`, with `workers` encoding processes) when
+    it is missing or out of date.
+    """
+    if rebuild:
+        discard_progress(directory)  # re-encode from scratch
+    index = None if rebuild else load_index(directory, manifest)
+    if index is None:
+        print(f"Building candidate index in {directory}...")
+        index = build_index(directory, model, manifest, load_candidates(), workers=workers)
+    else:
+        print(f"✓ Loaded candidate index from {directory}.")
+    return index
@@ -0,0 +1,71 @@
+# 1B/utils/candidate_sources.py
+
+"""
+Candidate Sources Module
+- Formality filter (`is_formal`) as a vectorised mask over an Arrow string column
+- Label + formality filtering with batched `datasets.filter` (optionally with num_proc)
+- Loaders for the paraphrase pools used by the 1B pipelines, registered in SOURCES
+"""
+
+import pyarrow.compute as pc
+from datasets import load_dataset
+
+INFORMAL_MARKERS = ("'", "?", " gonna ", " wanna ")
+
+
+def formal_mask(sentences):
+    """
+    Column form of the pipelines' `is_formal`: not null, more than 6
+    whitespace-separated words, and none of the informal markers.
+    """
+    words = pc.utf8_split_whitespace(pc.utf8_trim_whitespace(sentences))
+    mask = pc.greater(pc.list_value_length(words), 6)
+    for marker in INFORMAL_MARKERS:
+        mask = pc.and_(mask, pc.invert(pc.match_substring(sentences, marker)))
+    return pc.fill_null(mask, False)
+
+
+def select_candidates(dataset, text_column, label_column, label_value, num_proc=None):
+    """
+    Texts of the rows whose label equals `label_value` and whose text passes
+    the formality filter. Runs on Arrow batches; the datasets library caches
+    the filtered table, so reruns skip the filtering.
+    """
+    def keep(batch):
+        mask = pc.and_(pc.equal(batch[label_column], label_value), formal_mask(batch[text_column]))
+        return mask.to_numpy(zero_copy_only=False)
+
+    filtered = dataset.with_format("arrow").filter(keep, batched=True, batch_size=10_000, num_proc=num_proc)
+    return filtered[text_column].to_pylist()
+
+
+def load_pawswiki_candidates(num_proc=None):
+    """sentence2 of the formal paraphrase (label 1) pairs of PAWS-Wiki labeled_final train."""
+    paws = load_dataset("paws", "labeled_final", split="train")
+    return select_candidates(paws, "sentence2", "label", 1, num_proc)
+
+
+def load_qqp_candidates(split="train[:5000]", num_proc=None):
+    """Second question of the formal duplicate pairs of QQP."""
+    qqp = load_dataset("quora", split=split, trust_remote_code=True)
+
+    def second_question(batch):
+        return batch.append_column("candidate", pc.list_element(batch["questions.text"], 1))
+
+    qqp = qqp.flatten().with_format("arrow").map(second_question, batched=True, batch_size=10_000,
+                                                 num_proc=num_proc)
+    return select_candidates(qqp, "candidate", "is_duplicate", True, num_proc)
+
+
+def load_mrpc_candidates(num_proc=None):
+    """sentence2 of the formal paraphrase (label 1) pairs of GLUE MRPC train."""
+    mrpc = load_dataset("glue", "mrpc", split="train")
+    return select_candidates(mrpc, "sentence2", "label", 1, num_proc)
+
+
+# Source name -> (dataset description for index manifests, candidate loader)
+SOURCES = {
+    "pawswiki": ("paws/labeled_final:train", load_pawswiki_candidates),
+    "qqp": ("quora:train[:5000]", load_qqp_candidates),
+    "mrpc": ("glue/mrpc:train", load_mrpc_candidates),
+}
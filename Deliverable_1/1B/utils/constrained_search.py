@@ -0,0 +1,96 @@
+# 1B/utils/constrained_search.py
+
+"""
+Constrained Retrieval Module
+- Candidate word counts and hashed token sets computed once
+- Candidates partitioned by word count, so only length-eligible ones are scored
+- Best hit passing score, length-ratio and shared-token filters from a top-k list
+"""
+
+from collections import defaultdict
+
+import numpy as np
+
+
+def token_hashes(text):
+    """Sorted hashes of the distinct lowercased whitespace tokens of `text`."""
+    return np.unique(np.fromiter((hash(token) for token in set(text.lower().split())), dtype=np.int64))
+
+
+class ConstrainedRetriever:
+    """
+    Wraps a retrieval backend with the pipelines' acceptance filters: a hit
+    is accepted if `score > threshold`, `min_ratio <= candidate words /
+    clause words <= max_ratio` and the two share at least `min_shared`
+    lowercased tokens. The first accepted hit of the best `top_k` wins, so a
+    clause whose nearest candidate fails a filter can still use the next one.
+    """
+
+    def __init__(self, searcher, texts, min_ratio, max_ratio, min_shared, top_k=10):
+        self.searcher = searcher
+        self.min_ratio = min_ratio
+        self.max_ratio = max_ratio
+        self.min_shared = min_shared
+        self.top_k = top_k
+
+        self.lengths = np.fromiter((len(text.split()) for text in texts), dtype=np.int64, count=len(texts))
+        hashed = [token_hashes(text) for text in texts]
+        self.token_offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum([len(h) for h in hashed], out=self.token_offsets[1:])
+        self.tokens = np.concatenate(hashed) if hashed else np.zeros(0, dtype=np.int64)
+
+        # Candidate ids grouped by word count
+        self.length_order = np.argsort(self.lengths, kind="stable")
+        self.length_values, starts = np.unique(self.lengths[self.length_order], return_index=True)
+        self.length_starts = np.append(starts, len(texts))
+        self._eligible = {}
+
+    def eligible_ids(self, clause_length):
+        """Sorted ids of the candidates whose length ratio to a clause of `clause_length` words passes."""
+        ids = self._eligible.get(clause_length)
+        if ids is None:
+            ratios = self.length_values / max(1, clause_length)
+            groups = np.flatnonzero((ratios >= self.min_ratio) & (ratios <= self.max_ratio))
+            ids = np.sort(np.concatenate(
+                [self.length_order[self.length_starts[g]:self.length_starts[g + 1]] for g in groups]
+            )) if len(groups) else np.zeros(0, dtype=np.int64)
+            self._eligible[clause_length] = ids
+        return ids
+
+    def shared_tokens(self, clause, ids):
+        """Number of distinct lowercased tokens `clause` shares with each candidate in `ids`."""
+        ids = np.asarray(ids, dtype=np.int64)
+        starts, ends = self.token_offsets[ids], self.token_offsets[ids + 1]
+        sizes = ends - starts
+        positions = np.repeat(starts - np.cumsum(sizes) + sizes, sizes) + np.arange(sizes.sum())
+        found = np.isin(self.tokens[positions], token_hashes(clause), assume_unique=False)
+        counts = np.zeros(len(ids), dtype=np.int64)
+        np.add.at(counts, np.repeat(np.arange(len(ids)), sizes), found)
+        return counts
+
+    def best_hits(self, clauses, query_embeddings, threshold):
+        """For every clause, the best accepted `{corpus_id, score}` hit, or None."""
+        results = [None] * len(clauses)
+        by_length = defaultdict(list)
+        for i, clause in enumerate(clauses):
+            by_length[len(clause.split())].append(i)
+
+        for clause_length, members in by_length.items():
+            ids = self.eligible_ids(clause_length)
+            if not len(ids):
+                continue
+            hits = self.searcher.search(query_embeddings[members], top_k=self.top_k, ids=ids)
+            for i, clause_hits in zip(members, hits):
+                if not clause_hits:
+                    continue
+                hit_ids = np.array([hit["corpus_id"] for hit in clause_hits])
+                scores = np.array([hit["score"] for hit in clause_hits])
+                ratios = self.lengths[hit_ids] / max(1, clause_length)
+                accepted = (
+                    (scores > threshold)
+                    & (ratios >= self.min_ratio) & (ratios <= self.max_ratio)
+                    & (self.shared_tokens(clauses[i], hit_ids) >= self.min_shared)
+                )
+                if accepted.any():
+                    results[i] = clause_hits[int(np.argmax(accepted))]
+        return results
@@ -0,0 +1,132 @@
+# 1B/utils/embedding_cache.py
+
+"""
+Query Embedding Cache Module
+- Bounded in-memory LRU in front of model.encode for clause queries
+- Keyed by model name and whitespace-normalised text
+- Optional SQLite store shared across runs, read and written once per encode call
+"""
+
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+from utils.batching import DEFAULT_MAX_TOKENS, encode_batched
+
+
+def normalize_text(text):
+    """Lookup key of a clause query: whitespace runs become one space, ends are stripped."""
+    return ' '.join(text.split())
+
+
+class EmbeddingCache:
+    """
+    Maps `(model_name, normalised text)` to a float32 embedding. `counts`
+    tracks `hits` (memory), `disk_hits` and `misses`; `nbytes` is the memory
+    held by cached vectors and keys. Entries are only valid for one set of
+    encode options, so use one cache (or file) per encoding setup.
+    """
+
+    # Texts per SELECT ... IN (...) lookup, below SQLite's bound-parameter limit
+    DISK_LOOKUP_SIZE = 500
+
+    def __init__(self, maxsize=50_000, path=None):
+        self.maxsize = maxsize
+        self.path = path
+        self.counts = Counter()
+        self.nbytes = 0
+        self._memory = OrderedDict()
+        self._db = None
+
+    def _connection(self):
+        if self._db is None:
+            import sqlite3
+
+            self._db = sqlite3.connect(self.path, timeout=30)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT, text TEXT, dim INTEGER, vector BLOB, PRIMARY KEY (model, text))"
+            )
+            self._db.commit()
+        return self._db
+
+    def _load(self, model_name, texts):
+        """Vectors stored on disk for those of `texts` that have one, in a few IN queries."""
+        found = {}
+        for start in range(0, len(texts), self.DISK_LOOKUP_SIZE):
+            chunk = texts[start:start + self.DISK_LOOKUP_SIZE]
+            rows = self._connection().execute(
+                f"SELECT text, vector FROM embeddings WHERE model = ? AND text IN ({', '.join('?' * len(chunk))})",
+                (model_name, *chunk),
+            )
+            for text, blob in rows:
+                found[text] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def _store(self, model_name, texts, vectors):
+        """Newly encoded vectors go to disk in one transaction per encode call."""
+        with self._connection() as db:
+            db.executemany(
+                "INSERT OR IGNORE INTO embeddings VALUES (?, ?, ?, ?)",
+                [(model_name, text, len(vector), vector.tobytes()) for text, vector in zip(texts, vectors)],
+            )
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self.nbytes += vector.nbytes + len(key[1])
+        if len(self._memory) > self.maxsize:
+            (_, text), old = self._memory.popitem(last=False)
+            self.nbytes -= old.nbytes + len(text)
+
+    def encode(self, model, model_name, texts, max_tokens=DEFAULT_MAX_TOKENS):
+        """
+        Embeddings of `texts` (one row each, in order). Each distinct text is
+        looked up once, in memory and then on disk; the rest are encoded in
+        token-budget batches and cached.
+        """
+        keys = [normalize_text(text) for text in texts]
+        vectors = {}
+        unseen = []
+        for key in dict.fromkeys(keys):
+            vector = self._memory.get((model_name, key))
+            if vector is None:
+                unseen.append(key)
+            else:
+                self._memory.move_to_end((model_name, key))
+                vectors[key] = vector
+        self.counts["hits"] += len(keys) - len(unseen)
+
+        if unseen and self.path is not None:
+            for key, vector in self._load(model_name, unseen).items():
+                self.counts["disk_hits"] += 1
+                vectors[key] = vector
+                self._remember((model_name, key), vector)
+        missing = [key for key in unseen if key not in vectors]
+        self.counts["misses"] += len(missing)
+
+        if missing:
+            encoded = np.asarray(encode_batched(model, missing, max_tokens), dtype=np.float32)
+            for key, vector in zip(missing, encoded):
+                vectors[key] = vector
+                self._remember((model_name, key), vector)
+            if self.path is not None:
+                self._store(model_name, missing, encoded)
+        return np.stack([vectors[key] for key in keys])
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def info(self):
+        lookups = sum(self.counts.values())
+        hits = self.counts["hits"] + self.counts["disk_hits"]
+        return {
+            "hits": self.counts["hits"],
+            "disk_hits": self.counts["disk_hits"],
+            "misses": self.counts["misses"],
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "size": len(self._memory),
+            "maxsize": self.maxsize,
+            "bytes": self.nbytes,
+        }
@@ -0,0 +1,298 @@
+# 1B/utils/lexical_neighbours.py
+
+"""
+Lexical Neighbour Engine Module
+- Candidate vocabulary (the N most frequent words) pre-normalised into one contiguous matrix
+- Nearest neighbours of a word (or a batch of words) with one matrix product + argpartition
+- Same results as scanning the vocabulary with scipy's cosine one word at a time
+- Optional POS labels partition the matrix, so a POS-constrained search only scores one partition
+- Precomputed top-k table (int32 ids, float16 scores) for the most frequent words, memory-mapped;
+  built in a pool of processes, interrupted builds resume
+"""
+
+import copy
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from utils.resumable_build import MANIFEST_FILE, ResumableBuild, discard_progress, map_chunks
+
+IDS_FILE = "neighbour_ids.npy"
+SCORES_FILE = "neighbour_scores.npy"
+TABLE_VERSION = 1
+
+# Largest float16 rounding error for scores in [-1, 1]; closer calls are re-scored live
+FLOAT16_TOLERANCE = float(np.finfo(np.float16).eps)
+
+
+def top_k_rows(scores, k):
+    """Column ids of the `k` best scores of every row, best first (ties to the lower id)."""
+    k = min(k, scores.shape[1])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    values = np.take_along_axis(scores, top, axis=1)
+    return np.take_along_axis(top, np.lexsort((top, -values), axis=1), axis=1)
+
+
+class NeighbourEngine:
+    """
+    Cosine neighbours of words among the first `top_n` keys of a gensim
+    KeyedVectors model. Scores are computed in float64, like scipy's cosine,
+    and ties go to the more frequent (earlier) word, like a first-wins scan.
+    With `pos` labels (one per vocabulary word) the matrix is also split into
+    one contiguous partition per tag, and searches can be limited to one tag.
+    """
+
+    def __init__(self, vectors, top_n=10000, pos=None):
+        self.vectors = vectors
+        self.words = list(vectors.index_to_key[:top_n])
+        self.ids = {word: i for i, word in enumerate(self.words)}
+        self.lengths = np.array([len(word) for word in self.words], dtype=np.int64)
+        self.matrix = self._normalize(np.asarray(vectors.vectors[:len(self.words)], dtype=np.float64))
+        self.pos = None
+        self.partitions = {}
+        if pos is not None:
+            self.set_pos(pos)
+
+    def __getstate__(self):
+        # Pickled for spawned table workers: memory-mapped vectors travel as
+        # their file name and are re-opened there, not copied into the pickle
+        state = self.__dict__.copy()
+        array = self.vectors.vectors
+        if isinstance(array, np.memmap) and array.filename:
+            state["vectors"] = copy.copy(self.vectors)
+            state["vectors"].vectors = None
+            state["vectors_file"] = array.filename
+        return state
+
+    def __setstate__(self, state):
+        path = state.pop("vectors_file", None)
+        self.__dict__.update(state)
+        if path is not None:
+            self.vectors.vectors = np.load(path, mmap_mode="r")
+
+    @staticmethod
+    def _normalize(matrix):
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        return np.ascontiguousarray(matrix / np.where(norms == 0, 1, norms))
+
+    def set_pos(self, pos):
+        """Label the vocabulary with `pos` tags and build a `(ids, matrix)` partition per tag."""
+        self.pos = np.asarray(pos)
+        self.partitions = {}
+        for tag in np.unique(self.pos):
+            ids = np.flatnonzero(self.pos == tag)
+            self.partitions[str(tag)] = (ids, np.ascontiguousarray(self.matrix[ids]))
+
+    def _columns(self, pos):
+        """Vocabulary ids and matrix rows searched for `pos` (None: the whole vocabulary)."""
+        if pos is None:
+            return np.arange(len(self.words)), self.matrix
+        if self.pos is None:
+            raise ValueError("POS-constrained search needs POS labels (see set_pos)")
+        return self.partitions.get(pos, (np.zeros(0, dtype=np.int64), self.matrix[:0]))
+
+    def scores(self, words, pos=None):
+        """
+        Cosine scores of in-vocabulary `words` (one row each) against the
+        `pos` partition (one column per id in `_columns(pos)[0]`, the whole
+        vocabulary by default), each word's own column set to -inf.
+        """
+        ids, matrix = self._columns(pos)
+        queries = self._normalize(np.asarray([self.vectors[word] for word in words], dtype=np.float64))
+        scores = queries @ matrix.T
+        for row, word in enumerate(words):
+            own = self.ids.get(word)
+            if own is not None:
+                column = np.searchsorted(ids, own)
+                if column < len(ids) and ids[column] == own:
+                    scores[row, column] = -np.inf
+        return scores
+
+    def neighbours(self, word, k=10):
+        """The `k` best `(word, score)` neighbours of `word` (empty if it has no vector)."""
+        if word not in self.vectors:
+            return []
+        row = self.scores([word])[0]
+        top = top_k_rows(row[None, :], k)[0]
+        return [(self.words[i], float(row[i])) for i in top if np.isfinite(row[i])]
+
+    def best_many(self, words, threshold=0.7, pos=None, max_length_diff=None):
+        """
+        Best neighbour of every word if its score exceeds `threshold`, else
+        None. `pos` limits candidates to one POS partition and
+        `max_length_diff` to words at most that many characters longer or
+        shorter than the query word.
+        """
+        found = [word for word in dict.fromkeys(words) if word in self.vectors]
+        ids, _ = self._columns(pos)
+        best = {}
+        if found and len(ids):
+            scores = self.scores(found, pos)
+            if max_length_diff is not None:
+                query_lengths = np.array([len(word) for word in found])
+                scores[np.abs(self.lengths[ids][None, :] - query_lengths[:, None]) > max_length_diff] = -np.inf
+            top = np.argmax(scores, axis=1)  # first maximum, i.e. the most frequent word among ties
+            for word, i, score in zip(found, top, scores[np.arange(len(found)), top]):
+                best[word] = self.words[ids[i]] if score > threshold else None
+        return [best.get(word) for word in words]
+
+    def best(self, word, threshold=0.7, pos=None, max_length_diff=None):
+        return self.best_many([word], threshold, pos, max_length_diff)[0]
+
+
+class NeighbourTable:
+    """
+    Top-k neighbours (ids into `engine.words`, best first) and their scores
+    for the first `len(ids)` words of the model vocabulary, usually
+    memory-mapped. `best` answers those words from the table and any other
+    word (or a float16 score too close to the threshold to decide) with a
+    live search, so it agrees with `engine.best`.
+    """
+
+    def __init__(self, engine, ids, scores, manifest):
+        self.engine = engine
+        self.ids = ids
+        self.scores = scores
+        self.manifest = manifest
+        self.lookups = 0
+        self.fallbacks = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _row(self, word):
+        row = self.engine.vectors.key_to_index.get(word)
+        return row if row is not None and row < len(self.ids) else None
+
+    def _first_allowed(self, word, row, pos, max_length_diff):
+        """Column of the best stored neighbour of `word` passing the constraints, or None."""
+        for column, i in enumerate(self.ids[row]):
+            if not np.isfinite(self.scores[row, column]):
+                break
+            if pos is not None and self.engine.pos[i] != pos:
+                continue
+            if max_length_diff is not None and abs(self.engine.lengths[i] - len(word)) > max_length_diff:
+                continue
+            return column
+        return None
+
+    def best_many(self, words, threshold=0.7, pos=None, max_length_diff=None):
+        """
+        Same as `engine.best_many`. A constrained search uses the first stored
+        neighbour passing the constraints (the best one, as the stored list is
+        ordered); if none of the k does, the word is searched live.
+        """
+        results = [None] * len(words)
+        live = []
+        for i, word in enumerate(words):
+            self.lookups += 1
+            row = self._row(word)
+            column = None if row is None else self._first_allowed(word, row, pos, max_length_diff)
+            score = None if column is None else float(self.scores[row, column])
+            if score is None or abs(score - threshold) <= FLOAT16_TOLERANCE:
+                live.append(i)
+            elif score > threshold:
+                results[i] = self.engine.words[self.ids[row, column]]
+        if live:
+            self.fallbacks += len(live)
+            found = self.engine.best_many([words[i] for i in live], threshold, pos, max_length_diff)
+            for i, best in zip(live, found):
+                results[i] = best
+        return results
+
+    def best(self, word, threshold=0.7, pos=None, max_length_diff=None):
+        return self.best_many([word], threshold, pos, max_length_diff)[0]
+
+    def neighbours(self, word, k=10):
+        row = self._row(word)
+        if row is None or k > self.ids.shape[1]:
+            return self.engine.neighbours(word, k)
+        return [(self.engine.words[i], float(score))
+                for i, score in zip(self.ids[row, :k], self.scores[row, :k]) if np.isfinite(score)]
+
+
+def table_manifest(model_name, engine, rows, k):
+    """Manifest fields that decide whether a stored table can be reused for `engine`."""
+    vocabulary = hashlib.sha256("\n".join(engine.vectors.index_to_key[:max(rows, len(engine.words))]).encode())
+    return {
+        "version": TABLE_VERSION,
+        "model": model_name,
+        "dtype": str(engine.vectors.vectors.dtype),
+        "vocabulary": vocabulary.hexdigest(),
+        "vocabulary_size": len(engine.vectors.index_to_key),
+        "top_n": len(engine.words),
+        "rows": min(rows, len(engine.vectors.index_to_key)),
+        "k": min(k, len(engine.words)),
+    }
+
+
+def build_table(directory, engine, manifest, workers=None, chunk_size=512):
+    """
+    Compute the table for `manifest` and write it to `directory`; the
+    manifest is written last. Rows are scored in chunks of `chunk_size` by
+    `workers` spawned processes (each re-opening the engine's memory-mapped
+    vectors) and written into the memory-mapped arrays as they arrive. An
+    interrupted build resumes after the last written chunk (see ResumableBuild).
+    """
+    shape = (manifest["rows"], manifest["k"])
+    build = ResumableBuild(directory, {"manifest": manifest},
+                           {IDS_FILE: (np.int32, shape), SCORES_FILE: (np.float16, shape)}, chunk_size)
+    pending = build.pending()
+    computed = map_chunks(_table_chunk, [(start, end, shape[1]) for start, end in pending],
+                          workers or os.cpu_count() or 1, _init_worker, (engine,))
+    for (start, end), (chunk_ids, chunk_scores) in zip(pending, computed):
+        build.write(start, chunk_ids, chunk_scores)
+        print(f"  scored {end}/{shape[0]} words")
+    build.finish(manifest)
+    return load_table(directory, engine, manifest)
+
+
+# === Table Workers ===
+# Set up once per worker process by the pool initializer
+
+_engine = None
+
+
+def _init_worker(engine):
+    global _engine
+    _engine = engine
+
+
+def _table_chunk(job):
+    start, end, k = job
+    scores = _engine.scores(_engine.vectors.index_to_key[start:end])
+    top = top_k_rows(scores, k)
+    return top.astype(np.int32), np.take_along_axis(scores, top, axis=1).astype(np.float16)
+
+
+def load_table(directory, engine, manifest, mmap_mode="r"):
+    """Memory-map the table in `directory` if its manifest matches `manifest`, else return None."""
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE), encoding="utf-8") as f:
+            stored = json.load(f)
+        if stored != manifest:
+            return None
+        ids = np.load(os.path.join(directory, IDS_FILE), mmap_mode=mmap_mode)
+        scores = np.load(os.path.join(directory, SCORES_FILE), mmap_mode=mmap_mode)
+    except (OSError, ValueError):
+        return None
+    shape = (manifest["rows"], manifest["k"])
+    if ids.shape != shape or scores.shape != shape:
+        return None
+    return NeighbourTable(engine, ids, scores, stored)
+
+
+def load_or_build_table(directory, engine, model_name, rows=50_000, k=10, rebuild=False, workers=None):
+    """Return the stored neighbour table of the `rows` most frequent words, building it first if needed."""
+    manifest = table_manifest(model_name, engine, rows, k)
+    if rebuild:
+        discard_progress(directory)
+    table = None if rebuild else load_table(directory, engine, manifest)
+    if table is None:
+        print(f"Building neighbour table in {directory}...")
+        table = build_table(directory, engine, manifest, workers=workers)
+    else:
+        print(f"✓ Loaded neighbour table from {directory}.")
+    return table
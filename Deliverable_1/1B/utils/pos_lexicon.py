@@ -0,0 +1,94 @@
+# 1B/utils/pos_lexicon.py
+
+"""
+POS Lexicon Module
+- Coarse POS of every candidate vocabulary word, tagged once in bulk with nlp.pipe
+- Only the components POS needs are run (no parser, NER or lemmatizer)
+- Persisted as JSON and reused while the spaCy model and vocabulary are unchanged
+- Memoised word-to-POS oracle: lexicon table, then a bounded LRU, then batched tagging of unseen words
+"""
+
+import hashlib
+import json
+import os
+from collections import Counter, OrderedDict
+
+# Components that set token.pos_ in the en_core_web pipelines
+POS_COMPONENTS = ("tok2vec", "tagger", "attribute_ruler")
+
+
+def spacy_model_name(nlp):
+    return f"{nlp.meta['lang']}_{nlp.meta['name']}-{nlp.meta['version']}"
+
+
+def tag_words(nlp, words, batch_size=1000):
+    """`nlp(word)[0].pos_` of every word ("" if it has no tokens), via one nlp.pipe run."""
+    disabled = [name for name in nlp.pipe_names if name not in POS_COMPONENTS]
+    return [doc[0].pos_ if len(doc) else "" for doc in nlp.pipe(words, batch_size=batch_size, disable=disabled)]
+
+
+def load_or_build_pos_lexicon(path, nlp, words, rebuild=False):
+    """POS tags of `words` (in order), read from `path` or tagged and written there."""
+    manifest = {
+        "model": spacy_model_name(nlp),
+        "vocabulary": hashlib.sha256("\n".join(words).encode()).hexdigest(),
+    }
+    if not rebuild:
+        try:
+            with open(path, encoding="utf-8") as f:
+                stored = json.load(f)
+            if stored["manifest"] == manifest and len(stored["pos"]) == len(words):
+                print(f"✓ Loaded POS lexicon from {path}.")
+                return stored["pos"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    print(f"Tagging {len(words)} vocabulary words for the POS lexicon...")
+    pos = tag_words(nlp, words)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"manifest": manifest, "pos": pos}, f)
+    os.replace(path + ".tmp", path)
+    return pos
+
+
+class PosOracle:
+    """
+    `oracle(word)` is `nlp(word)[0].pos_` ("" for a word without tokens):
+    looked up in `table` (a precomputed {word: pos} lexicon), then in an LRU
+    of at most `maxsize` other words. `prefetch` tags all unseen words of a
+    batch with one nlp.pipe run, so later calls are dictionary hits.
+    """
+
+    def __init__(self, nlp, table=None, maxsize=10_000):
+        self.nlp = nlp
+        self.table = table or {}
+        self.maxsize = maxsize
+        self.counts = Counter()
+        self._memory = OrderedDict()
+
+    def prefetch(self, words):
+        unseen = [word for word in dict.fromkeys(words) if word not in self.table and word not in self._memory]
+        if unseen:
+            self.counts["tagged"] += len(unseen)
+            for word, pos in zip(unseen, tag_words(self.nlp, unseen)):
+                self._memory[word] = pos
+            while len(self._memory) > self.maxsize:
+                self._memory.popitem(last=False)
+
+    def __call__(self, word):
+        pos = self.table.get(word)
+        if pos is not None:
+            self.counts["table_hits"] += 1
+            return pos
+        pos = self._memory.get(word)
+        if pos is not None:
+            self._memory.move_to_end(word)
+            self.counts["hits"] += 1
+            return pos
+        self.counts["misses"] += 1
+        self.prefetch([word])
+        return self._memory[word]
+
+    def info(self):
+        return dict(self.counts, size=len(self._memory), maxsize=self.maxsize, table=len(self.table))
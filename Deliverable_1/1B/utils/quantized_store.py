@@ -0,0 +1,129 @@
+# 1B/utils/quantized_store.py
+
+"""
+Quantised Candidate Store Module
+- float16 or int8 (per-dimension scale) copies of a normalised embedding matrix
+- Optional binary sign codes for a Hamming-distance first pass
+- Saved next to the candidate index and memory-mapped on later runs
+"""
+
+import json
+import os
+
+import numpy as np
+
+# Number of set bits in every byte value, for Hamming distances over packed codes
+POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+class QuantizedStore:
+    """
+    Approximate scores against a unit-norm float32 matrix: `kind` is
+    "float16" or "int8"; int8 codes are `round(x / scale)` with one scale per
+    dimension (its largest absolute value / 127).
+    """
+
+    def __init__(self, kind, codes, scale=None, binary=None, chunk_size=65536):
+        self.kind = kind
+        self.codes = codes
+        self.scale = scale
+        self.binary = binary
+        self.chunk_size = chunk_size
+
+    @classmethod
+    def build(cls, embeddings, kind="int8", binary=False, chunk_size=65536):
+        """Quantise `embeddings` (unit-norm rows) chunk by chunk, so a memory-mapped matrix is never fully loaded."""
+        scale = None
+        if kind == "int8":
+            peak = np.zeros(embeddings.shape[1], dtype=np.float32)
+            for start in range(0, len(embeddings), chunk_size):
+                peak = np.maximum(peak, np.abs(embeddings[start:start + chunk_size]).max(axis=0))
+            scale = np.where(peak == 0, 1, peak / 127).astype(np.float32)
+        elif kind != "float16":
+            raise ValueError(f"Unsupported quantisation: {kind}")
+
+        codes = np.empty(embeddings.shape, dtype=np.int8 if kind == "int8" else np.float16)
+        bits = np.empty((len(embeddings), (embeddings.shape[1] + 7) // 8), dtype=np.uint8) if binary else None
+        for start in range(0, len(embeddings), chunk_size):
+            chunk = np.asarray(embeddings[start:start + chunk_size], dtype=np.float32)
+            if kind == "int8":
+                codes[start:start + len(chunk)] = np.clip(np.rint(chunk / scale), -127, 127)
+            else:
+                codes[start:start + len(chunk)] = chunk
+            if binary:
+                bits[start:start + len(chunk)] = np.packbits(chunk > 0, axis=1)
+        return cls(kind, codes, scale, bits, chunk_size)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (self.codes, self.scale, self.binary) if array is not None)
+
+    def scores(self, queries, ids=None):
+        """Approximate scores of unit-norm `queries` against all rows (or rows `ids`)."""
+        queries = np.atleast_2d(queries).astype(np.float32)
+        if self.scale is not None:
+            queries = queries * self.scale
+        rows = self.codes if ids is None else self.codes[ids]
+        return np.concatenate([
+            queries @ rows[start:start + self.chunk_size].T.astype(np.float32)
+            for start in range(0, max(1, len(rows)), self.chunk_size)
+        ], axis=1)
+
+    def hamming_shortlist(self, query, size, ids=None):
+        """Ids of the `size` rows (among the sorted `ids` if given) whose sign codes are closest to the query's."""
+        code = np.packbits(np.asarray(query) > 0)
+        rows = self.binary if ids is None else self.binary[ids]
+        ids = np.arange(len(rows)) if ids is None else np.asarray(ids)
+        distances = np.concatenate([
+            POPCOUNT[np.bitwise_xor(rows[start:start + self.chunk_size], code)].sum(axis=1, dtype=np.int32)
+            for start in range(0, max(1, len(rows)), self.chunk_size)
+        ])
+        if size >= len(distances):
+            return ids
+        return ids[np.sort(np.argpartition(distances, size - 1)[:size])]
+
+    @staticmethod
+    def _prefix(directory, kind, binary):
+        return os.path.join(directory, f"quantized_{kind}" + ("_binary" if binary else ""))
+
+    def save(self, directory, key=None):
+        prefix = self._prefix(directory, self.kind, self.binary is not None)
+        np.save(prefix + "_codes.npy", self.codes)
+        if self.scale is not None:
+            np.save(prefix + "_scale.npy", self.scale)
+        if self.binary is not None:
+            np.save(prefix + "_bits.npy", self.binary)
+        with open(prefix + ".json", "w", encoding="utf-8") as f:
+            json.dump({"kind": self.kind, "rows": len(self.codes), "key": key}, f)
+
+    @classmethod
+    def load(cls, directory, kind, binary=False, key=None):
+        """Memory-map a saved store, or return None if it is missing or was built from other embeddings."""
+        prefix = cls._prefix(directory, kind, binary)
+        try:
+            with open(prefix + ".json", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta["key"] != key:
+                return None
+            codes = np.load(prefix + "_codes.npy", mmap_mode="r")
+            scale = np.load(prefix + "_scale.npy") if kind == "int8" else None
+            bits = np.load(prefix + "_bits.npy", mmap_mode="r") if binary else None
+        except (OSError, ValueError, KeyError):
+            return None
+        if len(codes) != meta["rows"]:
+            return None
+        return cls(kind, codes, scale, bits)
+
+    @classmethod
+    def load_or_build(cls, directory, embeddings, kind="int8", binary=False, key=None):
+        """
+        Load the store saved in `directory` for `key` (e.g. the candidate
+        index checksum), else build it and save it there; without a
+        directory the store is only built in memory.
+        """
+        store = cls.load(directory, kind, binary, key) if directory else None
+        if store is None:
+            store = cls.build(embeddings, kind, binary)
+            if directory:
+                store.save(directory, key)
+        return store
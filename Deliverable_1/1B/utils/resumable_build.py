@@ -0,0 +1,125 @@
+# 1B/utils/resumable_build.py
+
+"""
+Resumable Chunked Build Module
+- Shared by the candidate index and neighbour table builders
+- Output arrays are .npy files memory-mapped for writing, filled chunk by chunk in row order
+- build.json records the finished chunks, so an interrupted build resumes after the last one
+- Chunks are computed by a pool of spawned worker processes, or in this process when that is not possible
+"""
+
+import json
+import multiprocessing
+import os
+
+import numpy as np
+
+MANIFEST_FILE = "manifest.json"
+PROGRESS_FILE = "build.json"
+
+
+class ResumableBuild:
+    """
+    Build of the arrays `{file name: (dtype, shape)}` in `directory`, all with
+    one row per item and written `chunk_size` rows at a time. `params`
+    describes the build (manifest, input digest, ...); a stored build.json
+    with the same params and array shapes is resumed, anything else starts
+    afresh. The directory's manifest is removed first and only written by
+    `finish`, so an interrupted build never looks valid.
+    """
+
+    def __init__(self, directory, params, arrays, chunk_size):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.rows = next(iter(arrays.values()))[1][0]
+        self.manifest_path = os.path.join(directory, MANIFEST_FILE)
+        self.progress_path = os.path.join(directory, PROGRESS_FILE)
+        if os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
+
+        self.progress = dict(params, chunk_size=chunk_size, done=0)
+        self.arrays = self._resume(arrays)
+        self.resumed = self.arrays is not None
+        if self.resumed:
+            print(f"Resuming build in {directory} at chunk {self.progress['done']}.")
+        else:
+            self.arrays = [
+                np.lib.format.open_memmap(os.path.join(directory, name), mode="w+", dtype=dtype, shape=shape)
+                for name, (dtype, shape) in arrays.items()
+            ]
+            self._save_progress()
+
+    def _resume(self, arrays):
+        try:
+            with open(self.progress_path, encoding="utf-8") as f:
+                stored = json.load(f)
+            if {key: value for key, value in stored.items() if key != "done"} != \
+                    {key: value for key, value in self.progress.items() if key != "done"}:
+                return None
+            opened = [np.lib.format.open_memmap(os.path.join(self.directory, name), mode="r+")
+                      for name in arrays]
+        except (OSError, ValueError):
+            return None
+        if any(array.shape != shape for array, (_, shape) in zip(opened, arrays.values())):
+            return None
+        self.progress["done"] = stored["done"]
+        return opened
+
+    def _save_progress(self):
+        with open(self.progress_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.progress, f)
+        os.replace(self.progress_path + ".tmp", self.progress_path)
+
+    def pending(self):
+        """`(start, end)` rows of every chunk still to be written, in order."""
+        return [(start, min(start + self.chunk_size, self.rows))
+                for start in range(self.progress["done"] * self.chunk_size, self.rows, self.chunk_size)]
+
+    def write(self, start, *chunks):
+        """Store the next chunk (one block of rows per array) and record it as done."""
+        for array, chunk in zip(self.arrays, chunks):
+            array[start:start + len(chunk)] = chunk
+            array.flush()
+        self.progress["done"] += 1
+        self._save_progress()
+
+    def finish(self, manifest):
+        """Close the arrays, then write `manifest` and drop the progress file."""
+        self.arrays = None
+        with open(self.manifest_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.remove(self.progress_path)
+
+
+def discard_progress(directory):
+    """Forget a partial build in `directory`, so the next one starts from scratch."""
+    if os.path.exists(os.path.join(directory, PROGRESS_FILE)):
+        os.remove(os.path.join(directory, PROGRESS_FILE))
+
+
+def map_chunks(function, jobs, workers=1, initializer=None, initargs=(), local=None):
+    """
+    `function(job)` of every job, in order, computed by `workers` spawned
+    processes that are each set up once with `initializer(*initargs)`; so
+    `function` and `initargs` must be picklable. With one worker or one job,
+    or if no processes can be started, the jobs run in this process through
+    `local` (default: `function` after running the initializer here).
+    """
+    if workers > 1 and len(jobs) > 1:
+        try:
+            # Spawn is available everywhere (and the only start method on Windows)
+            pool = multiprocessing.get_context("spawn").Pool(workers, initializer=initializer, initargs=initargs)
+        except (OSError, ValueError, NotImplementedError) as error:
+            print(f"  could not start worker processes ({error}); building in this process")
+        else:
+            try:
+                yield from pool.imap(function, jobs)
+            finally:
+                pool.terminate()
+            return
+    if local is None:
+        if initializer is not None:
+            initializer(*initargs)
+        local = function
+    yield from map(local, jobs)
@@ -0,0 +1,328 @@
+# 1B/utils/retrieval.py
+
+"""
+Retrieval Backends Module
+- Clause-to-candidate search over a candidate embedding matrix, by cosine score
+- exact: full scan (same results as util.semantic_search)
+- ivf: k-means clustered inverted lists, `nprobe` lists scanned per query
+- hnsw: graph index via hnswlib, `ef` candidates explored per query
+- quantized: float16/int8 (+ optional binary) scan, short list rescored in float32
+- Every backend's `search` can be restricted to a subset of candidate ids
+- ivf/hnsw/quantized structures are saved next to the candidate index and reused while its checksum matches
+- recall_report: measured recall@k and latency of a backend against exact search
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+
+from utils.quantized_store import QuantizedStore
+
+
+def normalize_rows(matrix):
+    """L2-normalise rows as float32; all-zero rows stay zero (score 0 against everything)."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def _top_k(scores, ids, top_k):
+    """`[{"corpus_id", "score"}]` for the best `top_k` of `scores` (ties broken by lower id)."""
+    if len(scores) > top_k:
+        keep = np.argpartition(-scores, top_k - 1)[:top_k]
+        scores, ids = scores[keep], ids[keep]
+    order = np.lexsort((ids, -scores))
+    return [{"corpus_id": int(ids[i]), "score": float(scores[i])} for i in order]
+
+
+def _saved(prefix, meta):
+    """Whether `prefix`.json records exactly `meta` (same candidate index key and build parameters)."""
+    try:
+        with open(prefix + ".json", encoding="utf-8") as f:
+            return json.load(f) == meta
+    except (OSError, ValueError):
+        return False
+
+
+def _save(prefix, meta, write):
+    """Call `write()`, then record `meta`; the old record goes first, so a partly saved structure is never reused."""
+    if os.path.exists(prefix + ".json"):
+        os.remove(prefix + ".json")
+    write()
+    with open(prefix + ".json", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+class ExactSearch:
+    """Scan every candidate. `normalized=True` skips normalising an already unit-norm matrix (no copy)."""
+
+    name = "exact"
+
+    def __init__(self, embeddings, normalized=False, chunk_size=65536):
+        self.embeddings = embeddings if normalized else normalize_rows(embeddings)
+        self.chunk_size = chunk_size
+
+    def scores(self, queries, ids=None):
+        queries = normalize_rows(np.atleast_2d(queries))
+        rows = self.embeddings if ids is None else self.embeddings[ids]
+        return np.concatenate([
+            queries @ rows[start:start + self.chunk_size].T
+            for start in range(0, max(1, len(rows)), self.chunk_size)
+        ], axis=1)
+
+    def search(self, queries, top_k=1, ids=None):
+        """Best `top_k` hits per query, among the sorted candidate `ids` if given."""
+        scores = self.scores(queries, ids)
+        ids = np.arange(scores.shape[1]) if ids is None else np.asarray(ids)
+        return [_top_k(row, ids, top_k) for row in scores]
+
+
+class IVFSearch(ExactSearch):
+    """
+    Inverted-file search: candidates are clustered with spherical k-means into
+    `nlist` lists and a query only scans the `nprobe` lists whose centroids are
+    closest. Higher `nprobe` raises recall and latency.
+    """
+
+    name = "ivf"
+
+    def __init__(self, embeddings, normalized=False, nlist=None, nprobe=8,
+                 train_size=50_000, iterations=20, seed=0, chunk_size=65536, directory=None, key=None):
+        super().__init__(embeddings, normalized, chunk_size)
+        count = len(self.embeddings)
+        self.nlist = min(count, nlist or max(1, int(4 * np.sqrt(count))))
+        self.nprobe = nprobe
+        meta = {"key": key, "rows": count, "nlist": self.nlist, "train_size": train_size,
+                "iterations": iterations, "seed": seed}
+        prefix = os.path.join(directory, f"ivf_{self.nlist}") if directory else None
+        if prefix and self._load(prefix, meta):
+            return
+
+        rng = np.random.default_rng(seed)
+        sample = self.embeddings[np.sort(rng.choice(count, min(count, train_size), replace=False))]
+        self.centroids = self._train(np.asarray(sample), iterations, rng)
+
+        assignments = np.concatenate([
+            np.argmax(self.embeddings[start:start + chunk_size] @ self.centroids.T, axis=1)
+            for start in range(0, count, chunk_size)
+        ])
+        self.order = np.argsort(assignments, kind="stable")
+        self.offsets = np.searchsorted(assignments[self.order], np.arange(self.nlist + 1))
+        if prefix:
+            def write():
+                for name in ("centroids", "order", "offsets"):
+                    np.save(f"{prefix}_{name}.npy", getattr(self, name))
+            _save(prefix, meta, write)
+
+    def _load(self, prefix, meta):
+        """Centroids and list order saved for `meta`; the order is memory-mapped."""
+        if not _saved(prefix, meta):
+            return False
+        try:
+            self.centroids = np.load(prefix + "_centroids.npy")
+            self.order = np.load(prefix + "_order.npy", mmap_mode="r")
+            self.offsets = np.load(prefix + "_offsets.npy")
+        except (OSError, ValueError):
+            return False
+        return len(self.order) == meta["rows"] and len(self.offsets) == self.nlist + 1
+
+    def _train(self, sample, iterations, rng):
+        centroids = sample[rng.choice(len(sample), self.nlist, replace=False)]
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            empty = np.bincount(labels, minlength=self.nlist) == 0
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = normalize_rows(sums)
+        return centroids
+
+    def search(self, queries, top_k=1, ids=None):
+        queries = normalize_rows(np.atleast_2d(queries))
+        nprobe = min(self.nprobe, self.nlist)
+        probes = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        results = []
+        for query, lists in zip(queries, probes):
+            scanned = np.sort(np.concatenate([self.order[self.offsets[l]:self.offsets[l + 1]] for l in lists]))
+            if ids is not None:
+                scanned = scanned[np.isin(scanned, ids, assume_unique=True)]
+            results.append(_top_k(self.embeddings[scanned] @ query, scanned, top_k))
+        return results
+
+
+class HNSWSearch:
+    """
+    Hierarchical navigable small-world graph (hnswlib, inner product on
+    normalised vectors). `M` and `ef_construction` trade build time and memory
+    for graph quality; `ef` trades query latency for recall.
+    """
+
+    name = "hnsw"
+
+    def __init__(self, embeddings, normalized=False, M=16, ef_construction=200, ef=64,
+                 threads=-1, seed=0, directory=None, key=None):
+        import hnswlib
+
+        self.index = hnswlib.Index(space="ip", dim=embeddings.shape[1])
+        self.ef = ef
+        meta = {"key": key, "rows": len(embeddings), "M": M, "ef_construction": ef_construction, "seed": seed}
+        prefix = os.path.join(directory, f"hnsw_M{M}_ef{ef_construction}") if directory else None
+        if prefix and _saved(prefix, meta):
+            try:
+                self.index.load_index(prefix + ".bin", max_elements=len(embeddings))
+                if self.index.get_current_count() == len(embeddings):
+                    return
+            except (OSError, RuntimeError):
+                pass
+            self.index = hnswlib.Index(space="ip", dim=embeddings.shape[1])
+
+        embeddings = embeddings if normalized else normalize_rows(embeddings)
+        self.index.init_index(max_elements=len(embeddings), M=M, ef_construction=ef_construction,
+                              random_seed=seed)
+        self.index.add_items(embeddings, np.arange(len(embeddings)), num_threads=threads)
+        if prefix:
+            _save(prefix, meta, lambda: self.index.save_index(prefix + ".bin"))
+
+    def search(self, queries, top_k=1, ids=None, exact_below=2000):
+        """
+        With `ids`, the graph walk only returns members of the subset; a
+        subset of at most `exact_below` ids is scanned exactly from the stored
+        vectors instead, where a filtered walk would visit mostly other nodes.
+        """
+        queries = normalize_rows(np.atleast_2d(queries))
+        if ids is not None and len(ids) <= max(exact_below, top_k):
+            ids = np.asarray(ids, dtype=np.int64)
+            scores = queries @ self.index.get_items(ids).T if len(ids) else np.zeros((len(queries), 0))
+            return [_top_k(row, ids, top_k) for row in scores]
+        self.index.set_ef(max(self.ef, top_k))
+        if ids is None:
+            labels, distances = self.index.knn_query(queries, k=top_k)
+        else:
+            id_set = set(np.asarray(ids).tolist())
+            # A Python filter is called under the GIL, so one thread is as fast as many
+            labels, distances = self.index.knn_query(queries, k=top_k, num_threads=1,
+                                                     filter=lambda i: i in id_set)
+        # hnswlib's "ip" distance is 1 - dot product
+        return [_top_k(1 - row_distances, row_labels.astype(np.int64), top_k)
+                for row_labels, row_distances in zip(labels, distances)]
+
+
+class QuantizedSearch:
+    """
+    Scan a QuantizedStore (float16, or int8 with per-dimension scale) and
+    rescore the best `shortlist` rows against the full-precision matrix, so
+    only those rows of a memory-mapped index are ever read. With `binary`,
+    a Hamming pass over sign codes first cuts the scan to `binary_shortlist`
+    rows. Scores returned are the exact float32 ones.
+    """
+
+    name = "quantized"
+
+    def __init__(self, embeddings, normalized=False, quantize="int8", binary=False,
+                 shortlist=100, binary_shortlist=2000, directory=None, key=None):
+        self.embeddings = embeddings if normalized else normalize_rows(embeddings)
+        self.store = QuantizedStore.load_or_build(directory, self.embeddings, quantize, binary, key)
+        self.shortlist = shortlist
+        self.binary_shortlist = binary_shortlist
+
+    def search(self, queries, top_k=1, ids=None):
+        queries = normalize_rows(np.atleast_2d(queries))
+        size = max(self.shortlist, top_k)
+        subset = np.arange(len(self.embeddings)) if ids is None else np.asarray(ids)
+        approx_all = None if self.store.binary is not None else self.store.scores(queries, ids)
+        results = []
+        for i, query in enumerate(queries):
+            if approx_all is None:
+                scanned = self.store.hamming_shortlist(query, self.binary_shortlist, ids)
+                approx = self.store.scores(query, scanned)[0]
+            else:
+                scanned = subset
+                approx = approx_all[i]
+            if len(scanned) > size:
+                scanned = np.sort(scanned[np.argpartition(-approx, size - 1)[:size]])
+            results.append(_top_k(self.embeddings[scanned] @ query, scanned, top_k))
+        return results
+
+
+BACKENDS = {backend.name: backend for backend in (ExactSearch, IVFSearch, HNSWSearch, QuantizedSearch)}
+
+
+def add_retrieval_arguments(parser):
+    """Command-line options shared by the pipelines for choosing and tuning the backend."""
+    parser.add_argument("--retrieval", choices=sorted(BACKENDS), default="exact",
+                        help="candidate search backend (default: exact)")
+    parser.add_argument("--top-k", type=int, default=10,
+                        help="hits per clause checked against the length/overlap filters")
+    parser.add_argument("--nlist", type=int, default=None, help="ivf: number of clusters")
+    parser.add_argument("--nprobe", type=int, default=8, help="ivf: clusters scanned per query")
+    parser.add_argument("--ef", type=int, default=64, help="hnsw: search breadth per query")
+    parser.add_argument("--M", type=int, default=16, help="hnsw: graph degree")
+    parser.add_argument("--quantize", choices=["float16", "int8"], default="int8",
+                        help="quantized: storage type of the scanned copy")
+    parser.add_argument("--binary-prefilter", action="store_true",
+                        help="quantized: Hamming first pass over binary sign codes")
+    parser.add_argument("--shortlist", type=int, default=100,
+                        help="quantized: rows rescored in full precision per query")
+
+
+def build_backend(args, embeddings, normalized=False, directory=None, key=None):
+    """
+    Build the backend selected by `args`; every approximate backend prints its
+    recall and latency against exact search (the quantized store also its
+    memory use). Approximate structures are saved in `directory` and reused
+    while `key` matches.
+    """
+    if args.retrieval == "ivf":
+        params = {"nlist": args.nlist, "nprobe": args.nprobe, "directory": directory, "key": key}
+    elif args.retrieval == "hnsw":
+        params = {"M": args.M, "ef": args.ef, "directory": directory, "key": key}
+    elif args.retrieval == "quantized":
+        params = {"quantize": args.quantize, "binary": args.binary_prefilter,
+                  "shortlist": args.shortlist, "directory": directory, "key": key}
+    else:
+        params = {}
+    start = time.perf_counter()
+    backend = BACKENDS[args.retrieval](embeddings, normalized=normalized, **params)
+    print(f"✓ {args.retrieval} retrieval over {len(embeddings)} candidates ready "
+          f"in {time.perf_counter() - start:.1f}s.")
+    if args.retrieval == "quantized":
+        full_mib = len(embeddings) * embeddings.shape[1] * 4 / 2**20
+        print(f"  memory: {backend.store.nbytes / 2**20:.1f} MiB scanned vs {full_mib:.1f} MiB float32")
+    if args.retrieval != "exact":
+        report = recall_report(backend, ExactSearch(embeddings, normalized=normalized), embeddings)
+        print(f"  recall@{report['k']}: {report['recall']:.3f} | "
+              f"{report['ms_per_query']:.2f} ms/query vs exact {report['exact_ms_per_query']:.2f} ms/query")
+    return backend
+
+
+def recall_report(backend, exact, embeddings, queries=None, k=10, sample=200, seed=0):
+    """
+    Recall@k of `backend` against `exact` and mean latency of both. Without
+    `queries`, a random sample of candidate rows is used as queries.
+    """
+    if queries is None:
+        rng = np.random.default_rng(seed)
+        queries = np.asarray(embeddings[np.sort(rng.choice(len(embeddings), min(sample, len(embeddings)),
+                                                           replace=False))])
+    k = min(k, len(embeddings))
+
+    timings = {}
+    results = {}
+    for label, searcher in (("backend", backend), ("exact", exact)):
+        start = time.perf_counter()
+        results[label] = [searcher.search(query, top_k=k)[0] for query in queries]
+        timings[label] = (time.perf_counter() - start) * 1000 / len(queries)
+
+    found = sum(
+        len({hit["corpus_id"] for hit in approx} & {hit["corpus_id"] for hit in truth})
+        for approx, truth in zip(results["backend"], results["exact"])
+    )
+    return {
+        "k": k,
+        "queries": len(queries),
+        "recall": found / (k * len(queries)),
+        "ms_per_query": timings["backend"],
+        "exact_ms_per_query": timings["exact"],
+    }
@@ -0,0 +1,103 @@
+# 1B/utils/sharded_index.py
+
+"""
+Sharded Candidate Index Module
+- One candidate index shard per paraphrase source (PAWS-Wiki, QQP, MRPC, ...)
+- Global candidate ids with a source tag per row
+- Shards searched in parallel threads, top-k hits merged; queries can be limited to some sources
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from utils.candidate_index import index_manifest, load_or_build_index
+from utils.candidate_sources import SOURCES, formal_mask, select_candidates
+
+
+class Shard:
+    """One source's CandidateIndex and search backend; its rows start at global id `offset`."""
+
+    def __init__(self, source, directory, index, searcher, offset):
+        self.source = source
+        self.directory = directory
+        self.index = index
+        self.searcher = searcher
+        self.offset = offset
+
+    def __len__(self):
+        return len(self.index)
+
+
+class ShardedIndex:
+    """
+    Candidate index made of per-source shards. `texts[i]` and `sources[i]`
+    describe global candidate id i, and `search` has the backend interface
+    (optional sorted id subset), returning hits with a "source" tag.
+    Adding a source only needs its entry in SOURCES and one new shard build.
+    """
+
+    def __init__(self, shards, active=None, pool=None):
+        self.shards = shards
+        self.active = [shard for shard in shards if active is None or shard.source in active]
+        self.texts = [text for shard in shards for text in shard.index.texts]
+        self.sources = np.repeat([shard.source for shard in shards], [len(shard) for shard in shards])
+        self._pool = pool or ThreadPoolExecutor(max_workers=max(1, len(shards)))
+
+    @classmethod
+    def load_or_build(cls, root, model, model_name, sources, make_searcher, num_proc=None,
+                      rebuild=False, workers=1):
+        """
+        Load (or build) the shard of every source under `root`/<source>_<model
+        tag> and wrap it with `make_searcher(embeddings, directory, key)`.
+        """
+        shards = []
+        offset = 0
+        for source in sources:
+            dataset, load_candidates = SOURCES[source]
+            directory = os.path.join(root, f"{source}_sbert")
+            manifest = index_manifest(model_name, dataset, formal_mask, select_candidates, load_candidates)
+            index = load_or_build_index(directory, model, manifest,
+                                        lambda: load_candidates(num_proc=num_proc), rebuild=rebuild,
+                                        workers=workers)
+            print(f"✓ {source}: {len(index)} formal paraphrase candidates.")
+            searcher = make_searcher(index.embeddings, directory, index.manifest["checksum"])
+            shards.append(Shard(source, directory, index, searcher, offset))
+            offset += len(index)
+        return cls(shards)
+
+    def only(self, sources):
+        """View of this index whose searches only cover `sources` (global ids are unchanged)."""
+        return ShardedIndex(self.shards, set(sources), self._pool)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def _search_shard(self, shard, queries, top_k, ids):
+        local = None
+        if ids is not None:
+            start, end = np.searchsorted(ids, [shard.offset, shard.offset + len(shard)])
+            local = ids[start:end] - shard.offset
+            if not len(local):
+                return [[] for _ in range(len(queries))]
+        hits = shard.searcher.search(queries, top_k=top_k, ids=local)
+        return [
+            [{"corpus_id": hit["corpus_id"] + shard.offset, "score": hit["score"], "source": shard.source}
+             for hit in query_hits]
+            for query_hits in hits
+        ]
+
+    def search(self, queries, top_k=1, ids=None):
+        """Search the active shards in parallel and merge their hits into the best `top_k` per query."""
+        queries = np.atleast_2d(queries)
+        ids = None if ids is None else np.asarray(ids)
+        per_shard = list(self._pool.map(
+            lambda shard: self._search_shard(shard, queries, top_k, ids), self.active
+        ))
+        merged = []
+        for i in range(len(queries)):
+            hits = [hit for shard_hits in per_shard for hit in shard_hits[i]]
+            hits.sort(key=lambda hit: (-hit["score"], hit["corpus_id"]))
+            merged.append(hits[:top_k])
+        return merged
@@ -0,0 +1,105 @@
+# 1B/utils/word_vectors.py
+
+"""
+Word Vector Store Module
+- Converts a gensim-data model (GloVe, FastText) once to gensim's native KeyedVectors format
+- Vectors saved as a separate .npy and loaded with mmap='r': fast start, pages shared across processes
+- Optional variants restricted to the most frequent words (+ extra words) and/or stored as float16,
+  cut from the mapped full copy; a JSON sidecar records which extra words a variant holds
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+
+def native_path(directory, name, vocab_size=None, dtype="float32"):
+    """File name of the full native copy of model `name`, or of one restricted/float16 variant of it."""
+    parts = [name]
+    if vocab_size is not None:
+        parts.append(f"top{vocab_size}")
+    if dtype != "float32":
+        parts.append(dtype)
+    return os.path.join(directory, "-".join(parts) + ".kv")
+
+
+def restrict(vectors, vocab_size=None, extra_words=(), dtype="float32"):
+    """
+    KeyedVectors with the first `vocab_size` words of `vectors` (all if None)
+    followed by the `extra_words` it also knows, in `dtype`. Word order, and so
+    frequency rank, is kept.
+    """
+    from gensim.models import KeyedVectors
+
+    keys = list(vectors.index_to_key[:vocab_size])
+    if vocab_size is not None:
+        kept = set(keys)
+        keys += [word for word in dict.fromkeys(extra_words) if word in vectors.key_to_index and word not in kept]
+    rows = [vectors.key_to_index[word] for word in keys]
+    restricted = KeyedVectors(vectors.vector_size, count=0, dtype=np.dtype(dtype))
+    restricted.add_vectors(keys, np.asarray(vectors.vectors[rows], dtype=dtype))
+    return restricted
+
+
+def save_vectors(vectors, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Always a separate .npy, so even small variants can be memory-mapped
+    vectors.save(path + ".tmp", separately=["vectors"])
+    os.replace(path + ".tmp.vectors.npy", path + ".vectors.npy")
+    os.replace(path + ".tmp", path)
+
+
+def convert(name, path):
+    """Load `name` with gensim's downloader and save it in native format to `path`."""
+    from gensim.downloader import load as gensim_load
+
+    print(f"Converting {name} to {path}...")
+    save_vectors(gensim_load(name), path)
+
+
+def variant_manifest(vocab_size, extra_words, dtype):
+    """What a stored variant was built from; the extra words only count when the vocabulary is cut."""
+    extra = None
+    if vocab_size is not None:
+        extra = hashlib.sha256("\n".join(sorted(set(extra_words))).encode()).hexdigest()
+    return {"vocab_size": vocab_size, "extra_words": extra, "dtype": dtype}
+
+
+def _stored_manifest(path):
+    try:
+        with open(path + ".json", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_vectors(name, directory, vocab_size=None, extra_words=(), dtype="float32", rebuild=False):
+    """
+    Memory-mapped KeyedVectors of `name` (first run: converted once to a full
+    native copy under `directory`). `vocab_size` keeps only the most frequent
+    words plus `extra_words`, other words then count as unknown; `dtype`
+    stores the vectors as e.g. float16. Such a variant is cut from the mapped
+    full copy and kept in one file per size and dtype, rebuilt in place when
+    the extra words change.
+    """
+    from gensim.models import KeyedVectors
+
+    full_path = native_path(directory, name)
+    if rebuild or not (os.path.exists(full_path) and os.path.exists(full_path + ".vectors.npy")):
+        convert(name, full_path)
+    path = native_path(directory, name, vocab_size, dtype)
+    if path != full_path:
+        manifest = variant_manifest(vocab_size, extra_words, dtype)
+        if rebuild or _stored_manifest(path) != manifest or not os.path.exists(path + ".vectors.npy"):
+            print(f"Building {path} from {full_path}...")
+            if os.path.exists(path + ".json"):
+                os.remove(path + ".json")  # a half-written variant must not look current
+            full = KeyedVectors.load(full_path, mmap="r")
+            save_vectors(restrict(full, vocab_size, extra_words, dtype), path)
+            with open(path + ".json", "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+    vectors = KeyedVectors.load(path, mmap="r")
+    print(f"✓ Loaded {len(vectors.index_to_key)} {name} vectors ({vectors.vectors.dtype}) from {path}.")
+    return vectors
@@ -3,6 +3,7 @@ Compare Embeddings Script
 Deliverable 2
 """
 
+import argparse
 import os
 import pandas as pd
 from utils.embedding_loader import load_embedding_model
@@ -29,20 +30,21 @@ def compute_cosine_similarities(model, data):
     """
     Given a list of {original, A, B, C} sentence sets, compute cosine similarities
     """
+    pairs = [(item, label) for item in data for label in ["A", "B1", "B2", "B3"]]
+    sims = model.similarities([item["original"] for item, _ in pairs], [item[label] for item, label in pairs])
+
     results = []
-    for item in data:
+    for (item, label), sim in zip(pairs, sims):
         original = item["original"]
-        for label in ["A", "B1", "B2", "B3"]:
-            recon = item[label]
-            sim = model.similarity(original, recon)  
-            results.append({
-                "sentence_id": item["id"],
-                "version_label": VERSION_LABELS.get(label, label),
-                "original_text": original,
-                "reconstructed_text": recon,
-                "cosine_similarity": round(sim, 4)
-            })
-            
+        recon = item[label]
+        results.append({
+            "sentence_id": item["id"],
+            "version_label": VERSION_LABELS.get(label, label),
+            "original_text": original,
+            "reconstructed_text": recon,
+            "cosine_similarity": round(sim, 4)
+        })
+        
     return results
 
 
@@ -90,14 +92,24 @@ def plot_embeddings(embedding_model, data, method="pca"):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare original and reconstructed sentence embeddings")
+    parser.add_argument("--benchmark-encoding", action="store_true",
+                        help="report tokens/s of plain vs token-budget batched encoding on the sentences")
+    args = parser.parse_args()
+
     print("Loading embedding model...")
     embedding_model = load_embedding_model(EMBEDDING_TYPE)
 
     print("Loading reconstruction data...")
     data = load_reconstruction_data(INPUT_FILE)
 
+    if args.benchmark_encoding:
+        sentences = list(dict.fromkeys(item[label] for item in data for label in ["original", *VERSION_LABELS]))
+        print("Encoding benchmark:", embedding_model.benchmark(sentences))
+
     print("Computing cosine similarities...")
     similarity_rows = compute_cosine_similarities(embedding_model, data)
+    print(f"Encoded at {embedding_model.tokens_per_second():.0f} tokens/s")
     save_similarity_results(similarity_rows, SIMILARITY_CSV)
 
     print("Creating PCA/t-SNE plots...")
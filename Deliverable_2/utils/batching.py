@@ -0,0 +1,65 @@
+# Deliverable_2/utils/batching.py
+
+"""
+Token-Budget Batching Module
+- Sorts SBERT inputs by token length and groups them into batches of at most `max_tokens` padded tokens
+- Restores the embeddings to input order and records token counts and time for throughput reports
+"""
+
+import time
+
+import numpy as np
+
+DEFAULT_MAX_TOKENS = 8192
+
+
+def token_lengths(model, texts):
+    """Token count of every text as the model will see it (special tokens included, truncated)."""
+    encoded = model.tokenizer(list(texts), add_special_tokens=True, truncation=True,
+                              max_length=model.max_seq_length)
+    return np.array([len(ids) for ids in encoded["input_ids"]], dtype=np.int64)
+
+
+def token_budget_batches(lengths, max_tokens=DEFAULT_MAX_TOKENS):
+    """
+    Index batches over `lengths` sorted shortest first, each as large as fits
+    `batch size * longest member <= max_tokens` (a text over the budget gets
+    a batch of its own).
+    """
+    batches = []
+    current = []
+    for i in np.argsort(lengths, kind="stable"):
+        if current and lengths[i] * (len(current) + 1) > max_tokens:
+            batches.append(current)
+            current = []
+        current.append(i)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def encode_batched(model, texts, max_tokens=DEFAULT_MAX_TOKENS, stats=None, **encode_kwargs):
+    """
+    `model.encode` over token-budget batches, returning a numpy array in input
+    order. `stats` (a Counter) accumulates `texts`, `tokens`, `padded_tokens`
+    and `seconds`.
+    """
+    start = time.perf_counter()
+    texts = list(texts)
+    lengths = token_lengths(model, texts) if texts else np.zeros(0, dtype=np.int64)
+    embeddings = None
+    padded = 0
+    for batch in token_budget_batches(lengths, max_tokens):
+        encoded = model.encode([texts[i] for i in batch], batch_size=len(batch), convert_to_numpy=True,
+                               show_progress_bar=False, **encode_kwargs)
+        if embeddings is None:
+            embeddings = np.empty((len(texts), encoded.shape[1]), dtype=encoded.dtype)
+        embeddings[batch] = encoded
+        padded += len(batch) * int(lengths[batch[-1]])
+    if embeddings is None:
+        embeddings = np.zeros((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+    if stats is not None:
+        stats.update(texts=len(texts), tokens=int(lengths.sum()), padded_tokens=padded)
+        stats["seconds"] += time.perf_counter() - start
+    return embeddings
+
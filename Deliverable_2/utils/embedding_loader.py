@@ -8,17 +8,63 @@ Embedding Loader Module
 # Imports for SBERT and FastText
 from sentence_transformers import SentenceTransformer, util
 import numpy as np
+import time
+from collections import Counter
+
+from utils.batching import DEFAULT_MAX_TOKENS, encode_batched
 
 
 class SBERTWrapper:
-    def __init__(self):
+    def __init__(self, max_tokens=DEFAULT_MAX_TOKENS):
         self.model = SentenceTransformer("all-MiniLM-L6-v2")
+        self.max_tokens = max_tokens
+        self.stats = Counter()
+
+    def encode(self, sentences):
+        """
+        Embeddings of `sentences` in input order, encoded in length-bucketed
+        batches sized by token budget. Throughput is tracked in `self.stats`.
+        """
+        return encode_batched(self.model, sentences, self.max_tokens, self.stats)
+
+    def tokens_per_second(self, stats=None):
+        stats = self.stats if stats is None else stats
+        return stats["tokens"] / stats["seconds"] if stats["seconds"] else 0.0
 
     def similarity(self, sent1, sent2):
         emb1 = self.model.encode(sent1, convert_to_tensor=True)
         emb2 = self.model.encode(sent2, convert_to_tensor=True)
         return util.cos_sim(emb1, emb2).item()
 
+    def similarities(self, sents1, sents2):
+        """Cosine similarity of every pair (sents1[i], sents2[i]), encoding each distinct sentence once."""
+        unique = list(dict.fromkeys(list(sents1) + list(sents2)))
+        position = {sentence: i for i, sentence in enumerate(unique)}
+        embeddings = self.encode(unique)
+        norms = np.linalg.norm(embeddings, axis=1)
+        norms[norms == 0] = 1
+        embeddings = embeddings / norms[:, None]
+        left = embeddings[[position[s] for s in sents1]]
+        right = embeddings[[position[s] for s in sents2]]
+        return (left * right).sum(axis=1).tolist()
+
+    def benchmark(self, sentences, batch_size=32):
+        """Tokens/s of plain `model.encode` (fixed batch size) versus token-budget batching."""
+        sentences = list(sentences)
+        start = time.perf_counter()
+        self.model.encode(sentences, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+        plain_seconds = time.perf_counter() - start
+
+        stats = Counter()
+        encode_batched(self.model, sentences, self.max_tokens, stats)
+        return {
+            "texts": len(sentences),
+            "tokens": stats["tokens"],
+            "plain_tokens_per_s": stats["tokens"] / plain_seconds if plain_seconds else 0.0,
+            "bucketed_tokens_per_s": self.tokens_per_second(stats),
+            "padding_ratio": stats["padded_tokens"] / max(1, stats["tokens"]),
+        }
+
     def token_embeddings(self, sentence):
         """
         Return per-token embeddings using SBERT's internal tokenizer and encoder.